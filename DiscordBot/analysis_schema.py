@@ -0,0 +1,196 @@
+# analysis_schema.py
+RISK_LEVELS = ["HIGH", "MEDIUM", "LOW", "MINIMAL"]
+
+# JSON schema for a single doxxing analysis. Claude is forced to answer through a tool
+# with this input schema, so the response arrives as structured data instead of free text.
+# The verdict fields come first so they can be read off a partially streamed response.
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_doxxing": {"type": "boolean"},
+        "probability_of_doxxing": {"type": "number", "minimum": 0, "maximum": 1},
+        "risk_level": {"type": "string", "enum": RISK_LEVELS},
+        "target_analysis": {
+            "type": "object",
+            "properties": {
+                "who_was_doxxed": {"type": "string", "description": "Full name of the person who was doxxed. If you do not know, say 'Unknown'"},
+                "relationship_to_author": {"type": "string", "description": "self/friend/stranger/enemy/unknown - include any context about their relationship"},
+                "is_public_figure": {"type": "boolean"},
+                "apparent_consent": {"type": "string", "description": "explicit/implied/none/unknown - explain what indicates consent level"}
+            },
+            "required": ["who_was_doxxed", "relationship_to_author", "is_public_figure", "apparent_consent"]
+        },
+        "information_disclosed": {
+            "type": "object",
+            "properties": {
+                "info_types_found": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["real_name", "address", "phone", "email", "workplace", "family_info", "financial", "government_id", "social_media", "photos", "medical", "other"]}
+                },
+                "specificity_level": {"type": "string", "description": "exact/approximate/vague - describe how precise the information is"},
+                "sensitive_details": {"type": "array", "items": {"type": "string"}, "description": "List every specific sensitive item found with exact details where possible"},
+                "partial_info": {"type": "string", "description": "Detailed description of incomplete but concerning information that could enable further doxxing"}
+            },
+            "required": ["info_types_found", "specificity_level", "sensitive_details", "partial_info"]
+        },
+        "moderator_summary": {
+            "type": "object",
+            "properties": {
+                "primary_concern": {"type": "string"},
+                "immediate_risks": {"type": "array", "items": {"type": "string"}},
+                "reasoning": {"type": "string"},
+                "recommended_action": {"type": "string", "description": "remove_immediately/warn_user/monitor_closely/no_action_needed - with brief justification"},
+                "follow_up_needed": {"type": "string"}
+            },
+            "required": ["primary_concern", "immediate_risks", "reasoning", "recommended_action", "follow_up_needed"]
+        }
+    },
+    "required": ["is_doxxing", "probability_of_doxxing", "risk_level", "target_analysis", "information_disclosed", "moderator_summary"]
+}
+
+# Compact verdict for the live path: just enough to act on and to build the moderator embed.
+# The detailed analysis is generated later, only if a moderator needs it.
+COMPACT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_doxxing": ANALYSIS_SCHEMA["properties"]["is_doxxing"],
+        "probability_of_doxxing": ANALYSIS_SCHEMA["properties"]["probability_of_doxxing"],
+        "risk_level": ANALYSIS_SCHEMA["properties"]["risk_level"],
+        "who_was_doxxed": ANALYSIS_SCHEMA["properties"]["target_analysis"]["properties"]["who_was_doxxed"],
+        "info_types_found": ANALYSIS_SCHEMA["properties"]["information_disclosed"]["properties"]["info_types_found"]
+    },
+    "required": ["is_doxxing", "probability_of_doxxing", "risk_level", "who_was_doxxed", "info_types_found"]
+}
+
+ANALYSIS_TOOL = {
+    "name": "report_doxxing_analysis",
+    "description": "Report the doxxing analysis of the post.",
+    "input_schema": ANALYSIS_SCHEMA
+}
+
+COMPACT_ANALYSIS_TOOL = {
+    "name": "report_doxxing_verdict",
+    "description": "Report the doxxing verdict for the post.",
+    "input_schema": COMPACT_ANALYSIS_SCHEMA
+}
+
+
+def batch_tool(tool):
+    """
+    Wraps a single-post tool so one call carries an analysis per post, tagged with its message ID.
+    """
+    schema = tool["input_schema"]
+    return {
+        "name": tool["name"] + "_batch",
+        "description": "Report one result per post, each tagged with the post's message ID.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "analyses": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"message_id": {"type": "string"}, **schema["properties"]},
+                        "required": ["message_id"] + schema["required"]
+                    }
+                }
+            },
+            "required": ["analyses"]
+        }
+    }
+
+
+class DoxxingAnalysis:
+    """
+    Validated result of a doxxing analysis. Verdict fields are required and checked;
+    detail sections are filled with defaults if the model left anything out.
+    """
+    SECTION_DEFAULTS = {
+        "target_analysis": {
+            "who_was_doxxed": "Unknown",
+            "relationship_to_author": "unknown",
+            "is_public_figure": False,
+            "apparent_consent": "unknown"
+        },
+        "information_disclosed": {
+            "info_types_found": [],
+            "specificity_level": "unknown",
+            "sensitive_details": [],
+            "partial_info": ""
+        },
+        "moderator_summary": {
+            "primary_concern": "Privacy violation detected",
+            "immediate_risks": [],
+            "reasoning": "No detailed reasoning provided",
+            "recommended_action": "review_needed",
+            "follow_up_needed": ""
+        }
+    }
+
+    def __init__(self, is_doxxing: bool, probability_of_doxxing: float, risk_level: str, sections: dict, compact: bool = False):
+        self.is_doxxing = is_doxxing
+        self.probability_of_doxxing = probability_of_doxxing
+        self.risk_level = risk_level
+        self.sections = sections
+        self.compact = compact
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Validate raw tool input. Raises ValueError if the verdict itself is missing or malformed.
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"analysis must be an object, got {type(data).__name__}")
+
+        is_doxxing = data.get("is_doxxing")
+        if isinstance(is_doxxing, str) and is_doxxing.lower() in ("true", "false"):
+            is_doxxing = is_doxxing.lower() == "true"
+        if not isinstance(is_doxxing, bool):
+            raise ValueError(f"is_doxxing must be a boolean, got {is_doxxing!r}")
+
+        try:
+            probability = max(0.0, min(1.0, float(data["probability_of_doxxing"])))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"probability_of_doxxing must be a number, got {data.get('probability_of_doxxing')!r}")
+
+        risk_level = str(data.get("risk_level", "")).upper()
+        if risk_level not in RISK_LEVELS:
+            raise ValueError(f"risk_level must be one of {RISK_LEVELS}, got {data.get('risk_level')!r}")
+
+        # Compact verdicts carry the two detail fields the live path needs at the top level
+        compact = not any(section in data for section in cls.SECTION_DEFAULTS)
+        if compact:
+            data = {
+                "target_analysis": {"who_was_doxxed": data.get("who_was_doxxed", "Unknown")},
+                "information_disclosed": {"info_types_found": data.get("info_types_found", [])}
+            }
+
+        sections = {}
+        for section, defaults in cls.SECTION_DEFAULTS.items():
+            raw = data.get(section)
+            raw = raw if isinstance(raw, dict) else {}
+            sections[section] = {}
+            for field, default in defaults.items():
+                value = raw.get(field, default)
+                if isinstance(default, list) and not isinstance(value, list):
+                    value = [value] if value else []
+                elif isinstance(default, str) and not isinstance(value, str):
+                    value = str(value)
+                sections[section][field] = value
+
+        return cls(is_doxxing, probability, risk_level, sections, compact)
+
+    def to_dict(self):
+        """
+        The analysis dict shape the rest of the bot already consumes.
+        """
+        analysis = {
+            "is_doxxing": self.is_doxxing,
+            "probability_of_doxxing": self.probability_of_doxxing,
+            "risk_level": self.risk_level,
+            **{section: dict(fields) for section, fields in self.sections.items()}
+        }
+        if self.compact:
+            # Tells the bot the detailed report still has to be generated
+            analysis["compact"] = True
+        return analysis
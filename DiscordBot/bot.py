@@ -2,20 +2,25 @@
 import discord
 from discord.ext import commands
 import os
+import asyncio
 import json
 import logging
 import re
 import requests
 from report import Report
 from review import Review
-from claude_detector import ClaudeDoxxingDetector, ProcessingClaudeResponse
+from detectors import create_detector, HedgedDetector, ProcessingDoxxingResponse
+from pii_prefilter import prefilter
+from ttl_cache import VerdictCache
 import pdb
 import count as count_tool
-from queue import PriorityQueue
-from itertools import count
+from review_queue import PersistentPriorityQueue
+from report_store import ReportStore
 from datetime import datetime
 import json
-from supabase_helper import insert_victim_log, insert_perpetrator_log, get_perpetrator_score
+from supabase_helper import insert_victim_log, insert_perpetrator_log, get_perpetrator_score, victim_scores_async, start_writer, stop_writer
+from report_record import combined_score
+from victim_index import victim_key
 
 # Set up logging to the console
 logger = logging.getLogger('discord')
@@ -40,17 +45,60 @@ class ModBot(discord.Client):
         self.mod_channels = {} # Map from guild to the mod channel id for that guild
         self.reports = {} # Map from user IDs to the state of their report
         self.reviews = {}
-        self.reviewing_queue = PriorityQueue()
-        self.unique = count(1)
-        self.ai_reports = {} # Map from report counts to AI detailed reports
+        self.reviewing_queue = PersistentPriorityQueue( # Survives restarts
+            tokens.get('state_db', 'bot_state.db'),
+            aging_rate=tokens.get('review_aging_per_hour', 0.05) / 3600 # Priority gained per second waited
+        )
+        self.unique = self.reviewing_queue.ids() # Report IDs continue after a restart
+        self.ai_reports = ReportStore(tokens.get('state_db', 'bot_state.db'), tokens.get('ai_reports_in_memory', 1000)) # Map from report counts to AI detailed reports
         self.warned = set()
+        self.keep_warm_task = None
+        self.rescore_task = None
+        self.background_tasks = set() # Fire-and-forget tasks, referenced until they finish
+        self.stream_verdicts = tokens.get('claude_streaming', False) # Act on the verdict before the detailed report finishes
         try:
-            self.gemini_detector = ClaudeDoxxingDetector()
-            print("🤖 Claude AI doxxing detector loaded successfully!")
+            # Backend chosen in tokens.json; with a hedge backend, slow primary calls are raced against it
+            self.detector = self.build_detector(tokens.get('detector', 'claude'))
+            if tokens.get('hedge_detector'):
+                self.detector = HedgedDetector(
+                    self.detector,
+                    self.build_detector(tokens['hedge_detector']),
+                    percentile=tokens.get('hedge_percentile', 0.95),
+                    initial_deadline=tokens.get('hedge_initial_deadline', 5.0)
+                )
+            print(f"🤖 AI doxxing detector loaded successfully! ({self.detector.name})")
         except Exception as e:
-            print(f"❌ Failed to initialize Claude detector: {e}")
+            print(f"❌ Failed to initialize AI detector: {e}")
             print("📝 Bot will continue without AI analysis")
-            self.gemini_detector = None
+            self.detector = None
+
+    def build_detector(self, name):
+        """
+        Creates a detector backend with its options from tokens.json.
+        """
+        cache = VerdictCache(
+            max_entries=tokens.get('verdict_cache_size', 10000),
+            ttl=tokens.get('verdict_cache_ttl', 3600)
+        )
+        if name == 'claude':
+            return create_detector(
+                name,
+                max_concurrency=tokens.get('claude_max_concurrency', 8),
+                batch_window=tokens.get('claude_batch_window'),
+                batch_size=tokens.get('claude_batch_size', 10),
+                tiers=tokens.get('claude_tiers'),
+                compact=tokens.get('claude_compact', True),
+                keep_warm_after=tokens.get('claude_keep_warm', 270),
+                cache=cache
+            )
+        if name == 'gemini':
+            return create_detector(
+                name,
+                project_id=tokens.get('google_project_id', tokens.get('project_id')),
+                location=tokens.get('google_location', 'us-central1'),
+                cache=cache
+            )
+        return create_detector(name, cache=cache)
 
     async def on_ready(self):
         # print(f"DEBUG: Bot name is '{self.user.name}'")
@@ -72,7 +120,102 @@ class ModBot(discord.Client):
             for channel in guild.text_channels:
                 if channel.name == f'group-{self.group_num}-mod':
                     self.mod_channels[guild.id] = channel
-        
+
+        # Buffer Supabase log inserts and write them in bulk from the background
+        await start_writer()
+
+        # Warm the detector's prompt cache now and after idle gaps (on_ready also fires on reconnect)
+        if self.detector and self.keep_warm_task is None:
+            self.keep_warm_task = asyncio.create_task(self.detector.keep_warm())
+
+        # Keep queued reports' priorities in step with victim scores
+        if self.rescore_task is None:
+            self.rescore_task = asyncio.create_task(self.rescore_loop(tokens.get('review_rescore_interval', 600)))
+
+    async def on_raw_message_delete(self, payload):
+        await self.evict_deleted_messages(payload.guild_id, payload.channel_id, [payload.message_id])
+
+    async def on_raw_bulk_message_delete(self, payload):
+        await self.evict_deleted_messages(payload.guild_id, payload.channel_id, payload.message_ids)
+
+    async def evict_deleted_messages(self, guild_id, channel_id, message_ids):
+        """
+        Removes queued reports of deleted messages, along with their detailed AI reports, so reviewers
+        never pull a report that can no longer be reviewed. Messages that are not queued (including
+        ones the bot removed itself) are ignored.
+        """
+        evicted = 0
+        for message_id in message_ids:
+            removed = self.reviewing_queue.remove_message((guild_id, channel_id, message_id))
+            if removed is None:
+                continue
+            priority, item_id, record = removed
+            for report_number in record.ai_report_numbers:
+                self.ai_reports.pop(report_number, None)
+            evicted += 1
+        if not evicted:
+            return
+        mod_channel = self.mod_channels.get(guild_id)
+        if mod_channel:
+            await mod_channel.send(f"{evicted} report{'s were' if evicted > 1 else ' was'} removed from the queue due to the post being deleted.")
+
+    async def rescore_reports(self, victim_names=None):
+        """
+        Recomputes the scores of queued reports from the current victim scores and moves them to
+        their new priorities. Only reports naming one of victim_names are updated, if given.
+        """
+        keys = victim_names and {victim_key(name) for name in victim_names}
+        queued = [
+            (item_id, record) for priority, item_id, record in self.reviewing_queue.pending()
+            if record.victim_name and record.victim_name != "Unknown" and (keys is None or victim_key(record.victim_name) in keys)
+        ]
+        if not queued:
+            return
+        # One bulk query, run off the event loop; the new priorities are applied back on the loop
+        scores = await victim_scores_async(list({record.victim_name for item_id, record in queued}))
+        for item_id, record in queued:
+            # Skip reports claimed or changed by a merge while the query ran
+            if not self.reviewing_queue.is_queued(item_id) or record.victim_name not in scores:
+                continue
+            score = combined_score(scores[record.victim_name], record.risk)
+            if score and score != record.score:
+                record.score = score
+                self.reviewing_queue.reprioritize(item_id, record.priority, record)
+
+    def spawn(self, coroutine):
+        """
+        Runs coroutine in the background, keeping a reference until it finishes and logging any error.
+        """
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+        return task
+
+    def _background_task_done(self, task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Background task {task.get_coro().__qualname__} failed: {task.exception()!r}")
+
+    async def rescore_loop(self, interval):
+        """
+        Rescores the whole review queue every interval seconds and warns when the longest-waiting
+        report is older than review_max_age (seconds) from tokens.json.
+        """
+        max_age = tokens.get('review_max_age')
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rescore_reports()
+            except Exception as e:
+                print(f"❌ Review queue rescoring failed: {e}")
+            age = self.reviewing_queue.max_age()
+            if max_age is not None and age > max_age:
+                print(f"⚠️ Oldest report has waited {age / 3600:.1f}h in the review queue ({self.reviewing_queue.qsize()} queued)")
+
+    async def close(self):
+        # Write out any buffered log rows before disconnecting
+        await stop_writer()
+        await super().close()
 
     async def on_message(self, message):
         '''
@@ -154,7 +297,7 @@ class ModBot(discord.Client):
         if author_id in self.reports and self.reports[author_id].report_complete():
             finalized_report = self.reports[author_id]
             if not finalized_report.cancelled:
-                self.reviewing_queue.put((1 / finalized_report.get_report_score(), next(self.unique), finalized_report.full_report))
+                self.reviewing_queue.put_nowait((finalized_report.full_report.priority, next(self.unique), finalized_report.full_report))
             self.reports.pop(author_id)
 
     async def handle_channel_message(self, message):
@@ -182,7 +325,19 @@ class ModBot(discord.Client):
         """
         Runs AI bot on message sent in general channel. Returns analysis.
         """
-        if not self.gemini_detector:
+        # Local PII prefilter: chatter with no PII signal never reaches the LLM
+        prefilter_result = prefilter(message.content)
+        if not prefilter_result.has_signal:
+            return {
+                'is_doxxing': False,
+                'probability_of_doxxing': 0.0,
+                'confidence': 0.0,  # Backward compatibility
+                'reasoning': 'No PII signal found by local prefilter',
+                'original_message': message.content,
+                'author': message.author.display_name
+            }
+
+        if not self.detector and not prefilter_result.certain:
             return {
                 'is_doxxing': False,
                 'probability_of_doxxing': 0.0,
@@ -191,13 +346,31 @@ class ModBot(discord.Client):
                 'original_message': message.content,
                 'author': message.author.mention
             }
-        
+
         try:
-            # Use Gemini to analyze the message
-            analysis = self.gemini_detector.analyze_for_doxxing(
-                message_content=message.content,
-                author_name=message.author.display_name
-            )
+            deleted_early = False
+            if prefilter_result.certain:
+                # Fast path: government/financial identifiers are removed without waiting on the LLM
+                analysis = prefilter_result.fast_path_analysis()
+            elif self.stream_verdicts:
+                # Delete high-probability messages as soon as the verdict streams in
+                async def on_verdict(verdict):
+                    nonlocal deleted_early
+                    deleted_early = await self.act_on_verdict(verdict, message)
+                analysis = await self.detector.analyze_for_doxxing_stream(
+                    message_content=message.content,
+                    author_name=message.author.display_name,
+                    on_verdict=on_verdict
+                )
+            else:
+                # Analyze the message without blocking the event loop (batched if enabled)
+                analysis = await self.detector.analyze_for_doxxing_batched(
+                    message_id=message.id,
+                    message_content=message.content,
+                    author_name=message.author.display_name
+                )
+            analysis['prefilter'] = sorted(prefilter_result.categories)
+            analysis['deleted_early'] = deleted_early
             
             # Add original message for reference
             analysis['original_message'] = message.content
@@ -226,13 +399,52 @@ class ModBot(discord.Client):
                 'author': message.author.mention
             }
 
+    async def get_ai_report(self, report_number):
+        """
+        Returns the detailed AI report for an evaluation ID, generating it first if the
+        message was judged with a compact verdict. Generated reports replace the pending entry.
+        """
+        report = self.ai_reports.get(report_number)
+        if not isinstance(report, dict):
+            return report
+
+        compact_analysis = report['analysis']
+        detailed = await self.detector.detailed_analysis_async(report['message_content'], report['author_name'])
+        if detailed.get('analysis_failed', False):
+            # Show what we have; the next request will try again
+            return ProcessingDoxxingResponse(compact_analysis, None).format_detailed_report()
+
+        # Keep the verdict the bot acted on; take everything else from the detailed analysis
+        for field in ('is_doxxing', 'probability_of_doxxing', 'risk_level'):
+            detailed[field] = compact_analysis[field]
+        bot_report = ProcessingDoxxingResponse(detailed, None).format_detailed_report()
+        if report_number in self.ai_reports:
+            self.ai_reports[report_number] = bot_report
+        return bot_report
+
+    async def act_on_verdict(self, verdict, message):
+        """
+        Early action on a streamed verdict: deletes the message if it will be automatically removed anyway.
+        Returns whether the message was deleted. Logging and notifications wait for the full analysis.
+        """
+        if not verdict.get('is_doxxing', False) or verdict.get('probability_of_doxxing', 0.0) <= 0.7:
+            return False
+        try:
+            await message.delete()
+            return True
+        except discord.NotFound:
+            # Already gone; nothing left to remove
+            return True
+        except discord.Forbidden:
+            return False
+
     async def react_to_message(self, analysis, message, mod_channel):
         """
         Takes action based on the response from the bot.
         """
         # Only act if doxxing is detected
         if analysis.get('is_doxxing', False):
-            formatter = ProcessingClaudeResponse(analysis, message)
+            formatter = ProcessingDoxxingResponse(analysis, message)
             embed, bot_report, risk, confidence, doxxing_score = formatter.format_bot_response()
             
             # Take action based on probability level
@@ -243,7 +455,15 @@ class ModBot(discord.Client):
                 
                 # At least 50% probability: add detailed report to dictionary
                 report_number = next(self.unique)
-                self.ai_reports[report_number] = bot_report
+                if analysis.get('compact', False):
+                    # Compact verdict: the detailed report is generated when a moderator asks for it
+                    self.ai_reports[report_number] = {
+                        'message_content': message.content,
+                        'author_name': message.author.display_name,
+                        'analysis': analysis
+                    }
+                else:
+                    self.ai_reports[report_number] = bot_report
 
                 # Probability over 84%: delete message, notify and warn offender
                 if confidence > 0.7:
@@ -285,12 +505,14 @@ class ModBot(discord.Client):
                     else:
                         info_text = ""
 
-                    # Delete the original message
-                    await message.delete()
+                    # Delete the original message (unless it was already removed from the streamed verdict)
+                    if not analysis.get('deleted_early', False):
+                        await message.delete()
                     
                     # Log to Supabase: victim and perpetrator
                     if victim_name and victim_name != "Unknown":
                         insert_victim_log(victim_name, datetime.now())
+                        self.spawn(self.rescore_reports([victim_name]))
                     insert_perpetrator_log(str(message.author.id), message.author.display_name, datetime.now(), victim_name, risk)
 
                     perp_score = get_perpetrator_score(str(message.author.id))
@@ -363,13 +585,10 @@ class ModBot(discord.Client):
 
                 # 50-84% probability: add report to manual review queue
                 else:
-                    # Same priority calculation as in report.py
-                    priority = 0
-                    if doxxing_score == 0 or risk == 0:
-                        priority = doxxing_score + risk
-                    else:
-                        priority = doxxing_score * risk
-                    self.reviewing_queue.put((1 / priority, report_number, embed))
+                    formatter.record.ai_report_numbers.append(report_number)
+                    self.reviewing_queue.put_nowait((formatter.record.priority, report_number, formatter.record))
+                    # Reviewers will want the details, so generate them now in the background
+                    self.spawn(self.get_ai_report(report_number))
                                     
                 # Log bot evaluation to moderator channel
                 embed.add_field(name="📝 **Original Message**", value=f"```{message.content[:1000]}```" + ("... (truncated)" if len(message.content) > 1000 else ""), inline=False)
@@ -1,10 +1,14 @@
 # gemini_detector.py
 import json
 import os
+import re
+import asyncio
+import time
 import anthropic
-import discord
-from datetime import datetime
-from supabase_helper import victim_score
+from collections import deque
+from ttl_cache import VerdictCache
+from analysis_schema import ANALYSIS_TOOL, COMPACT_ANALYSIS_TOOL, DoxxingAnalysis, batch_tool
+from detectors import DoxxingDetector, ProcessingDoxxingResponse
 
 token_path = 'tokens.json'
 if not os.path.isfile(token_path):
@@ -13,26 +17,7 @@ with open(token_path) as f:
     tokens = json.load(f)
     anthropic_key = tokens['anthropic']
 
-class ClaudeDoxxingDetector:
-    def __init__(self):        
-        # Load Anthropic model
-        self.model = anthropic.Anthropic(api_key=anthropic_key)
-        
-        print(f"✅ Anthropic detector initialized")
-    
-    def analyze_for_doxxing(self, message_content: str, author_name: str = "Unknown"):
-        """
-        Analyze a Discord message for doxxing using Gemini AI
-        """
-        try:
-            # Call Claude
-            response = self.model.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=1024,
-                system=[
-                {
-                    "type": "text",
-                    "text": """You are a content moderator with experience in detecting doxxing, harassment, and privacy violations across social platforms. You understand the nuanced difference between legitimate information sharing and malicious doxxing.
+SYSTEM_PROMPT = """You are a content moderator with experience in detecting doxxing, harassment, and privacy violations across social platforms. You understand the nuanced difference between legitimate information sharing and malicious doxxing.
 
 You will receive messages in the following format
 
@@ -244,250 +229,450 @@ If the message doesn't make sense, and you don't understand it, it's probably lo
 • "Elon Musk’s office is at Tesla HQ, 3500 Deer Creek Rd, Palo Alto, CA — that’s the registered business address."
 • "Mark Zuckerberg lives in Palo Alto, near Crescent Park. His address was part of a lawsuit — it’s public record now."
 
-Respond with ONLY valid JSON:
-{
-    "is_doxxing": true/false,
-    "probability_of_doxxing": 0.85,
-    "risk_level": "HIGH/MEDIUM/LOW/MINIMAL",
-    "target_analysis": {
-        "who_was_doxxed": "Full name of the person who was doxxed. If you do not know, say 'Unknown'",
-        "relationship_to_author": "self/friend/stranger/enemy/unknown - include any context about their relationship",
-        "is_public_figure": true/false,
-        "apparent_consent": "explicit/implied/none/unknown - explain what indicates consent level"
-    },
-    "information_disclosed": {
-        "info_types_found": ["real_name", "address", "phone", "email", "workplace", "family_info", "financial", "government_id", "social_media", "photos"],
-        "specificity_level": "exact/approximate/vague - describe how precise the information is",
-        "sensitive_details": ["List every specific sensitive item found with exact details where possible"],
-        "partial_info": "Detailed description of incomplete but concerning information that could enable further doxxing"
-    },
-    "moderator_summary": {
-        "primary_concern": "Detailed one-line summary explaining the main risk and why it matters",
-        "immediate_risks": ["Comprehensive list of specific immediate dangers to the target"],
-        "reasoning": "Thorough step-by-step analysis: What information was shared? Why is it concerning? What context clues inform your probability assessment? What harm could result? Why this probability level?",
-        "recommended_action": "remove_immediately/warn_user/monitor_closely/no_action_needed - with brief justification",
-        "follow_up_needed": "Specific actionable steps: monitor patterns, check for coordination, verify target identity, escalate to authorities, etc."
+Report your analysis by calling the tool you are given. Fill in every field it asks for, starting with the verdict (is_doxxing, probability_of_doxxing, risk_level)."""
+
+class ClaudeDoxxingDetector(DoxxingDetector):
+    name = "claude"
+    MODEL = "claude-3-5-haiku-20241022"
+
+    # The verdict fields come first in the tool schema, so they can be read off a partial stream
+    VERDICT_PATTERNS = {
+        "is_doxxing": re.compile(r'"is_doxxing"\s*:\s*(true|false)'),
+        "probability_of_doxxing": re.compile(r'"probability_of_doxxing"\s*:\s*(-?[0-9.]+)\s*[,}\n]'),
+        "risk_level": re.compile(r'"risk_level"\s*:\s*"([^"]*)"'),
     }
-}""",
+
+    def __init__(self, max_concurrency: int = 8, batch_window: float = None, batch_size: int = 10, cache: VerdictCache = None, tiers: list = None, compact: bool = False, keep_warm_after: float = 270, usage_window: int = 100):
+        # Load Anthropic model (sync client for scripts, async client for the bot)
+        self.model = anthropic.Anthropic(api_key=anthropic_key)
+        self.async_model = anthropic.AsyncAnthropic(api_key=anthropic_key)
+
+        # Caps the number of Claude calls in flight at once from the bot
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Micro-batching: messages arriving within batch_window seconds (up to batch_size) share one request.
+        # A batch_window of None turns batching off.
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._pending_batch = [] # (message_id, message_content, author_name, future)
+        self._batch_timer = None
+        self._batch_tasks = set() # Running batches, referenced so they are not garbage-collected
+
+        # Verdicts for recently seen content, so reposts skip the LLM. Identical messages
+        # arriving while the first copy is still being analyzed wait for that result.
+        self.cache = cache if cache is not None else VerdictCache()
+        self._in_flight = {} # cache key -> future
+
+        # Model cascade: every message goes to the first tier. A result whose probability lands in a
+        # tier's uncertain_band [low, high] is re-analyzed by the next tier. The last tier's band is
+        # the one that ends up in human review (0.5-0.7 in react_to_message).
+        self.tiers = tiers if tiers else [{"model": self.MODEL, "uncertain_band": [0.5, 0.7]}]
+        self.tier_counters = [{"analyzed": 0, "escalated": 0, "uncertain": 0} for tier in self.tiers]
+
+        # Compact mode asks the live path for the verdict only; detailed_analysis_async fills in the rest on demand
+        self.compact = compact
+        self.live_tool = COMPACT_ANALYSIS_TOOL if compact else ANALYSIS_TOOL
+
+        # Prompt-cache telemetry: token totals, plus the last usage_window responses for rolling hit rates
+        self.usage_totals = {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        self._recent_usage = deque(maxlen=usage_window)
+
+        # The cached prompt expires after 5 idle minutes; keep_warm refreshes it after keep_warm_after idle seconds
+        self.keep_warm_after = keep_warm_after
+        self._last_request_at = None
+        
+        print(f"✅ Anthropic detector initialized")
+
+    def _request_kwargs(self, message_content: str, author_name: str, tier: int = 0, tool: dict = None):
+        """
+        Arguments for messages.create, shared by the sync and async clients.
+        """
+        tool = tool if tool is not None else self.live_tool
+        user_content = f'Analyze the following post:\nAUTHOR: {author_name}\nMESSAGE CONTENT: "{message_content}".'
+        return self._build_request(user_content, 256 if tool is COMPACT_ANALYSIS_TOOL else 1024, tool, tier)
+
+    def _build_request(self, user_content: str, max_tokens: int, tool: dict, tier: int = 0):
+        # Forcing the tool call makes Claude answer with JSON matching the tool's input schema
+        return {
+            "model": self.tiers[tier]["model"],
+            "max_tokens": max_tokens,
+            "tools": [tool],
+            "tool_choice": {"type": "tool", "name": tool["name"]},
+            "system": [
+                {
+                    "type": "text",
+                    "text": SYSTEM_PROMPT,
                     "cache_control": {"type": "ephemeral"}
                 },
-                ],
-                messages=[{"role": "user", "content": f'Analyze the following post:\nAUTHOR: {author_name}\nMESSAGE CONTENT: "{message_content}".'}],
-            )
-            
-            print(response.usage.model_dump_json())
-
+            ],
+            "messages": [{"role": "user", "content": user_content}],
+        }
+    
+    def analyze_for_doxxing(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Analyze a Discord message for doxxing using Claude (blocking)
+        """
+        key = self.cache.key_for(message_content, author_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        tier = 0
+        analysis = None
+        while True:
             try:
-                # Clean up response
-                result_text = str(response.content[0].text).strip()
-                if '```json' in result_text:
-                    result_text = result_text.split('```json')[1].split('```')[0].strip()
-                elif '```' in result_text:
-                    result_text = result_text.split('```')[1].strip()
-                
-                opening = self.findnth(result_text, "{", 1)
-                closing = self.findnth(result_text, "}", 4)
-
-                result_text = result_text[opening:closing + 1]
-                
-                # Parse JSON
-                analysis = json.loads(result_text)
-                
-                # Ensure confidence is between 0 and 1
-                if 'probability_of_doxxing' in analysis:
-                    analysis['probability_of_doxxing'] = max(0.0, min(1.0, float(analysis['probability_of_doxxing'])))
-                
-                return analysis
+                # Call Claude
+                response = self.model.messages.create(**self._request_kwargs(message_content, author_name, tier))
             except Exception as e:
-                with open("missed.txt", "a") as f:
-                    f.write(response.content[0].text + "\n\n")
-                print("Added to missed.txt")
-                return None
-            
+                print(f"❌ Error calling Claude: {e}")
+                escalated = self._failed_analysis(e)
+            else:
+                escalated = self._parse_response(response)
+            if analysis is not None and escalated.get('analysis_failed'):
+                analysis = self._keep_for_review(tier - 1, analysis, escalated)
+                break
+            analysis = escalated
+            if not self._should_escalate(tier, analysis):
+                break
+            tier += 1
+        if not analysis.get('analysis_failed') and not analysis.get('escalation_failed'):
+            self.cache.put(key, analysis)
+        return analysis
+
+    async def analyze_for_doxxing_async(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Analyze a Discord message for doxxing using Claude without blocking the event loop.
+        At most max_concurrency calls run at once; the rest wait their turn.
+        """
+        async def analyze():
+            return await self._escalate_async(message_content, author_name, await self._call_claude_async(message_content, author_name))
+        return await self._cached_analysis(message_content, author_name, analyze)
+
+    async def _call_claude_async(self, message_content: str, author_name: str, tier: int = 0, tool: dict = None):
+        try:
+            async with self._semaphore:
+                response = await self.async_model.messages.create(**self._request_kwargs(message_content, author_name, tier, tool))
         except Exception as e:
             print(f"❌ Error calling Claude: {e}")
-            return {
-                "is_doxxing": False,
-                "probability_of_doxxing": 0.0,
-                "reasoning": f"Analysis failed: {str(e)}"
-            }
-
-    def findnth(self, haystack, needle, n):
-        start = haystack.find(needle, 0)
-        for i in range(n - 1):
-            if start == -1 or start > len(haystack):
-                return -1
-            next_needle = haystack.find(needle, start + 1)
-            start = next_needle
-        return start
-
-class ProcessingClaudeResponse:
-    def __init__(self, analysis, message):
-        self.analysis = analysis
-        self.message = message
-
-    def format_bot_response(self):
-        """
-        Format the detailed doxxing analysis for display. Three return variables:
-            embed - the embed that should be sent to the moderator channel with a summary of response (None if no doxxing)
-            bot_report - string with details of bot's decision making process (None if no doxxing)
-            risk - bot's assessment of risk, represented as an integer (None if no doxxing or >84% confidence of doxxing)
-            confidence - bot's confidence in doxxing assessment (None if no doxxing)
+            return self._failed_analysis(e)
+        return self._parse_response(response)
+
+    def _should_escalate(self, tier: int, analysis: dict):
         """
-        
-        if not self.analysis.get('is_doxxing', False):
-            return None, None, None, None, None
-        
-        # Extract key information - support both probability_of_doxxing and confidence
-        confidence = float(self.analysis.get('probability_of_doxxing', self.analysis.get('confidence', 0)))
-        risk_level = self.analysis.get('risk_level', 'UNKNOWN')
-        
-        # Target information
-        target_info = self.analysis.get('target_analysis', {})
-        who_doxxed = target_info.get('who_was_doxxed', 'Unknown person')
-        relationship = target_info.get('relationship_to_author', 'unknown')
-        
-        # What information was shared
-        info_disclosed = self.analysis.get('information_disclosed', {})
-        info_types = info_disclosed.get('info_types_found', [])
-        sensitive_details = info_disclosed.get('sensitive_details', [])
-        
-        # Context and intent
-        context = self.analysis.get('context_analysis', {})
-        intent = context.get('apparent_intent', 'unclear')
-        harm_level = context.get('potential_harm_level', 'unknown')
-        
-        # Moderator summary
-        mod_summary = self.analysis.get('moderator_summary', {})
-        primary_concern = mod_summary.get('primary_concern', 'Privacy violation detected')
-        reasoning = mod_summary.get('reasoning', 'No detailed reasoning provided')
-        action = mod_summary.get('recommended_action', 'review_needed')
-
-        # Create a user-friendly list of what was detected
-        detected_info = []
-        type_mapping = {
-            'phone': 'phone number',
-            'email': 'email address', 
-            'address': 'address',
-            'real_name': 'personal name',
-            'financial': 'financial information',
-            'government_id': 'ID information',
-            'social_media': 'social media account',
-            'workplace': 'workplace information'
-        }
-        
-        for info_type in info_types:
-            if info_type in type_mapping:
-                detected_info.append(type_mapping[info_type])
+        Count the result for its tier and decide whether the next tier should take a look.
+        """
+        counters = self.tier_counters[tier]
+        counters["analyzed"] += 1
+        if analysis.get('analysis_failed'):
+            return False
+        low, high = self.tiers[tier].get("uncertain_band", [0.5, 0.7])
+        if not low <= analysis.get('probability_of_doxxing', 0.0) <= high:
+            return False
+        if tier + 1 >= len(self.tiers):
+            counters["uncertain"] += 1
+            return False
+        counters["escalated"] += 1
+        return True
+
+    async def _escalate_async(self, message_content: str, author_name: str, analysis: dict):
+        """
+        Run a first-tier result up the cascade for as long as it stays in the uncertain band.
+        """
+        tier = 0
+        while self._should_escalate(tier, analysis):
+            tier += 1
+            escalated = await self._call_claude_async(message_content, author_name, tier)
+            if escalated.get('analysis_failed'):
+                return self._keep_for_review(tier - 1, analysis, escalated)
+            analysis = escalated
+        return analysis
+
+    def _keep_for_review(self, tier: int, analysis: dict, failed: dict):
+        """
+        The next tier failed on a result that was uncertain at this tier. Keep this tier's analysis
+        and place it in the human review band (0.5-0.7 in react_to_message), so the failure neither
+        clears the message nor removes it automatically. The result is not cached.
+        """
+        print(f"⚠️ Escalation past {self.tiers[tier]['model']} failed, sending the message to human review: {failed.get('reasoning')}")
+        self.tier_counters[tier]["uncertain"] += 1
+        probability = min(max(analysis.get('probability_of_doxxing', 0.0), 0.5), 0.7)
+        return {**analysis, "is_doxxing": True, "probability_of_doxxing": probability, "escalation_failed": True}
+
+    def tier_stats(self):
+        """
+        Per-tier model, uncertain band and counters, for monitoring the cascade.
+        """
+        return [
+            {"model": tier["model"], "uncertain_band": tier.get("uncertain_band", [0.5, 0.7]), **counters}
+            for tier, counters in zip(self.tiers, self.tier_counters)
+        ]
+
+    async def detailed_analysis_async(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Full analysis (target, disclosed information, moderator summary) for a message that was
+        judged in compact mode. Used when a moderator asks for details or the report enters review.
+        """
+        if not self.compact:
+            return await self.analyze_for_doxxing_async(message_content, author_name)
+        return await self._cached_analysis(
+            message_content, author_name,
+            lambda: self._call_claude_async(message_content, author_name, tool=ANALYSIS_TOOL),
+            variant="detailed"
+        )
+
+    async def analyze_for_doxxing_stream(self, message_content: str, author_name: str = "Unknown", on_verdict=None):
+        """
+        Analyze a Discord message for doxxing, streaming the response. As soon as is_doxxing,
+        probability_of_doxxing and risk_level have arrived, on_verdict(verdict) is started so the
+        caller can act while the detailed report is still being generated. Returns the full analysis.
+        """
+        async def analyze():
+            # Only the first tier is streamed; verdicts it may escalate are not acted on early
+            return await self._escalate_async(message_content, author_name, await self._stream_claude_async(message_content, author_name, on_verdict))
+        return await self._cached_analysis(message_content, author_name, analyze)
+
+    def _may_escalate(self, probability: float):
+        """
+        Whether a first-tier result with this probability would be sent to the next tier.
+        """
+        low, high = self.tiers[0].get("uncertain_band", [0.5, 0.7])
+        return len(self.tiers) > 1 and low <= probability <= high
+
+    async def _stream_claude_async(self, message_content: str, author_name: str, on_verdict):
+        verdict = None
+        verdict_task = None
+        response = None
+        error = None
+        try:
+            async with self._semaphore:
+                async with self.async_model.messages.stream(**self._request_kwargs(message_content, author_name)) as stream:
+                    streamed_text = ""
+                    async for event in stream:
+                        if event.type != "content_block_delta" or event.delta.type != "input_json_delta":
+                            continue
+                        streamed_text += event.delta.partial_json
+                        if verdict is None and on_verdict is not None:
+                            verdict = self._parse_verdict(streamed_text)
+                            # A verdict the next tier will re-check is not final, so nothing acts on it early
+                            if verdict is not None and not self._may_escalate(verdict["probability_of_doxxing"]):
+                                verdict_task = asyncio.create_task(on_verdict(verdict))
+                    response = await stream.get_final_message()
+        except Exception as e:
+            print(f"❌ Error calling Claude: {e}")
+            error = e
+
+        # Early action must finish before the caller acts on the full analysis
+        if verdict_task is not None:
+            try:
+                await verdict_task
+            except Exception as e:
+                print(f"❌ Error acting on streamed verdict: {e}")
+
+        analysis = self._parse_response(response) if response is not None else self._failed_analysis(error)
+        if analysis.get('analysis_failed') and verdict_task is not None:
+            # The caller already acted on the streamed verdict (e.g. deleted the message), so report
+            # that verdict to be logged and notified as usual; the detailed report is generated later
+            return {**verdict, "compact": True}
+        return analysis
+
+    def _parse_verdict(self, partial_text: str):
+        """
+        Read the verdict fields out of a partially streamed response (None until all have arrived).
+        """
+        verdict = {}
+        for field, pattern in self.VERDICT_PATTERNS.items():
+            match = pattern.search(partial_text)
+            if not match:
+                return None
+            verdict[field] = match.group(1)
+        verdict["is_doxxing"] = verdict["is_doxxing"] == "true"
+        verdict["risk_level"] = verdict["risk_level"].upper()
+        try:
+            verdict["probability_of_doxxing"] = max(0.0, min(1.0, float(verdict["probability_of_doxxing"])))
+        except ValueError:
+            return None
+        return verdict
+
+    async def analyze_for_doxxing_batched(self, message_id, message_content: str, author_name: str = "Unknown"):
+        """
+        Queue a message for the next micro-batch and wait for its own verdict.
+        Falls back to a single request when batching is turned off.
+        """
+        if self.batch_window is None:
+            return await self.analyze_for_doxxing_async(message_content, author_name)
+        async def analyze():
+            return await self._escalate_async(message_content, author_name, await self._enqueue_for_batch(message_id, message_content, author_name))
+        return await self._cached_analysis(message_content, author_name, analyze)
+
+    async def _enqueue_for_batch(self, message_id, message_content: str, author_name: str):
+        future = asyncio.get_running_loop().create_future()
+        self._pending_batch.append((str(message_id), message_content, author_name, future))
+        if len(self._pending_batch) >= self.batch_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush_batch)
+        return await future
+
+    def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._pending_batch = self._pending_batch, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(lambda task: self._batch_finished(task, batch))
+
+    def _batch_finished(self, task, batch):
+        """
+        Releases every caller still waiting on a batch that was cancelled or crashed, so none hangs.
+        """
+        self._batch_tasks.discard(task)
+        for message_id, message_content, author_name, future in batch:
+            if future.done():
+                continue
+            if task.cancelled():
+                future.cancel()
             else:
-                detected_info.append(info_type.replace('_', ' '))
-        
-        # Format the detected info nicely
-        print(detected_info)
-        if len(detected_info) == 1:
-            info_text = detected_info[0]
-        elif len(detected_info) == 2:
-            info_text = f"{detected_info[0]} and {detected_info[1]}"
-        elif len(detected_info) > 0:
-            info_text = f"{', '.join(detected_info[:-1])}, and {detected_info[-1]}"
-        else:
-            info_text = ""
-        
-        # Format the report
-        bot_report = f"""
-    **🚨 DOXXING DETECTED - {risk_level} RISK**
+                future.set_exception(task.exception() or RuntimeError("batch finished without a verdict"))
 
-    **👤 Target:** {who_doxxed} ({relationship} to author)
-    **📊 Probability:** {confidence * 100}%
-    **⚠️ Primary Concern:** {primary_concern}
+    async def _run_batch(self, batch):
+        """
+        Send one request for the whole batch and hand each message its verdict.
+        Messages the model skipped are retried on their own, concurrently (within max_concurrency).
+        """
+        if len(batch) == 1:
+            message_id, message_content, author_name, future = batch[0]
+            if not future.done():
+                future.set_result(await self._call_claude_async(message_content, author_name))
+            return
+
+        posts = "\n\n".join(
+            f'MESSAGE ID: {message_id}\nAUTHOR: {author_name}\nMESSAGE CONTENT: "{message_content}"'
+            for message_id, message_content, author_name, future in batch
+        )
+        user_content = (
+            f"Analyze each of the following {len(batch)} posts independently.\n\n{posts}\n\n"
+            "Call the tool once with one result per post, each tagged with the post's MESSAGE ID."
+        )
+
+        verdicts = {}
+        try:
+            async with self._semaphore:
+                response = await self.async_model.messages.create(**self._build_request(user_content, min(1024 * len(batch), 8192), batch_tool(self.live_tool)))
+            verdicts = self._parse_batch_response(response)
+        except Exception as e:
+            print(f"❌ Error calling Claude for batch of {len(batch)}: {e}")
+
+        missing = []
+        for message_id, message_content, author_name, future in batch:
+            if future.done():
+                continue
+            if message_id in verdicts:
+                future.set_result(verdicts[message_id])
+            else:
+                missing.append((message_content, author_name, future))
 
-    **📋 Information Exposed:**
-    • Types: {info_text}
-    • Sensitive Details: {', '.join(sensitive_details) if sensitive_details else 'See message content'}
+        analyses = await asyncio.gather(*(self._call_claude_async(message_content, author_name) for message_content, author_name, future in missing))
+        for (message_content, author_name, future), analysis in zip(missing, analyses):
+            if not future.done():
+                future.set_result(analysis)
 
-    **🎯 Context Analysis:**
-    • Intent: {intent.title()}
-    • Harm Level: {harm_level.title()}
+    def record_usage(self, usage):
+        """
+        Adds a response's token usage to the prompt-cache counters.
+        """
+        self._last_request_at = time.monotonic()
+        counts = {field: getattr(usage, field, 0) or 0 for field in self.usage_totals if field != "requests"}
+        self.usage_totals["requests"] += 1
+        for field, value in counts.items():
+            self.usage_totals[field] += value
+        self._recent_usage.append(counts)
+
+    def usage_stats(self):
+        """
+        Token totals and prompt-cache hit rates: the share of prompt tokens read from the cache,
+        overall and over recent responses, and the share of recent responses that hit the cache at all.
+        """
+        def token_hit_rate(usages):
+            read = sum(usage["cache_read_input_tokens"] for usage in usages)
+            prompt = sum(usage["cache_read_input_tokens"] + usage["cache_creation_input_tokens"] + usage["input_tokens"] for usage in usages)
+            return read / prompt if prompt else 0.0
+
+        recent = list(self._recent_usage)
+        return {
+            **self.usage_totals,
+            "token_hit_rate": token_hit_rate([self.usage_totals]),
+            "rolling_token_hit_rate": token_hit_rate(recent),
+            "rolling_request_hit_rate": sum(1 for usage in recent if usage["cache_read_input_tokens"]) / len(recent) if recent else 0.0,
+        }
 
-    **🤖 AI Analysis:** {reasoning}
+    async def warm_up(self):
+        """
+        Writes the system prompt and live tool into the prompt cache with a one-token request,
+        so the next real message reads them from the cache instead of paying to create it.
+        Only the first tier is warmed; it sees every message.
+        """
+        self._last_request_at = time.monotonic()
+        try:
+            async with self._semaphore:
+                response = await self.async_model.messages.create(**self._build_request("Warm-up request: there is no post to analyze.", 1, self.live_tool))
+        except Exception as e:
+            print(f"❌ Prompt cache warm-up failed: {e}")
+            return
+        self.record_usage(response.usage)
+        stats = self.usage_stats()
+        print(f"🔥 Prompt cache warmed (rolling hit rate {stats['rolling_token_hit_rate']:.0%} over {len(self._recent_usage)} responses)")
 
-    **✅ Recommended Action:** {action.replace('_', ' ').title()}
+    async def keep_warm(self):
+        """
+        Warms the prompt cache now and again whenever no request has gone out for keep_warm_after seconds.
+        Runs until cancelled.
+        """
+        if not self.keep_warm_after:
+            return
+        while True:
+            await self.warm_up()
+            while (idle := time.monotonic() - self._last_request_at) < self.keep_warm_after:
+                await asyncio.sleep(self.keep_warm_after - idle)
+
+    def _parse_batch_response(self, response):
         """
+        Turn a batched Claude response into a map from message ID to analysis dict.
+        Analyses that fail validation are left out and retried on their own.
+        """
+        self.record_usage(response.usage)
 
-        # High confidence: post will be automatically deleted
-        if confidence > 0.7:
-            foo, risk_number = self._get_risk_values(risk_level.lower(), 0)
-            embed = discord.Embed(
-                title=f"Post Automatically Removed for Doxxing: {risk_level} Risk",
-                timestamp=datetime.now() # Timestamp of when the report was initiated
-            )
-        
-            embed.add_field(name="**Victim Name**", value=f"```{who_doxxed}```", inline=False)
-            embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
+        tool_input = self._tool_input(response)
+        verdicts = {}
+        for raw in (tool_input or {}).get("analyses", []):
+            try:
+                message_id = str(raw["message_id"])
+                verdicts[message_id] = DoxxingAnalysis.from_dict(raw).to_dict()
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"❌ Invalid analysis in batch response: {e}")
+        return verdicts
 
-            # If Doxxing info types were collected, add them to the embed
-            embed.add_field(name="**Doxxing Information Types Reported**", value=', '.join(info_types) if info_types else 'Various personal details', inline=False)
-                
-            embed.add_field(name="**Harm Assessment**", value=harm_level.title(), inline=False)
+    def _parse_response(self, response):
+        """
+        Turn a Claude tool-use response into a validated analysis dict.
+        """
+        self.record_usage(response.usage)
 
-            embed.add_field(name="**Result**", value="✅ **Automatic Action Taken:** Message deleted and user notified.", inline=False)
-                        
-            return embed, bot_report.strip(), risk_number, confidence, None
-        
-        # Medium confidence: post will be sent for manual review
-        if confidence >= 0.5:
-            doxxing_score = 0
-            if who_doxxed != "Unknown":
-                doxxing_score = victim_score(who_doxxed)
-
-            embed_color, risk_number = self._get_risk_values(risk_level.lower(), doxxing_score)
-
-            embed = discord.Embed(
-                title=f"Added by Bot to Review Queue: {risk_level} Doxxing Risk, medium confidence",
-                color=embed_color,
-                timestamp=datetime.now() # Timestamp of when the report was initiated
-            )
-
-            embed.add_field(name="**Content of Reported Message**", value=f"```{self.message.content[:1000]}```" + ("... (truncated)" if len(self.message.content) > 1000 else ""), inline=False)
-            embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
-            embed.add_field(name="**Filed By (Reporter)**", value=f"MODERATOR BOT", inline=True)
-
-            embed.add_field(name="**Specific Reason Provided by Reporter**", value="Doxxing", inline=False)
-            
-            embed.add_field(name="**Victim Name**", value=who_doxxed, inline=False)
-
-            embed.add_field(name="**Doxxing Information Types Reported**", value=', '.join(info_types) if info_types else 'Various personal details', inline=False)
-                
-            embed.add_field(name="**Harm Assessment**", value=harm_level.title(), inline=True)
-            embed.add_field(name="**Risk Level**", value=risk_number, inline=True)
-                
-            embed.add_field(name="**Direct Link to Reported Message**", value=f"[Click to View Message]({self.message.jump_url})", inline=False)
-
-            return embed, bot_report.strip(), risk_number, confidence, doxxing_score
-        
-        return None, None, None, confidence, None
-    
-    def _get_risk_values(self, risk, doxxing_score):
-        """
-        Return a color based on the AI bot's risk level and doxxing score.
-        Return number based on AI bot's risk level.
-        """
-        color = 0x95a5a6
-        number = 1
-        if risk == "minimal" or (doxxing_score > 0 and doxxing_score < 10):
-            color = 0x3498db   # Blue
-        elif risk == "low" or doxxing_score < 30:
-            color = 0xf1c40f   # Yellow
-        elif risk == "medium" or doxxing_score < 50:
-            color = 0xe67e22   # Orange
-        elif risk == "high" or doxxing_score > 0:
-            color = 0xe74c3c   # Red
-        if risk == "minimal":
-            number = 1
-        elif risk == "Low":
-            number = 2
-        elif risk == "medium":
-            number = 3
-        elif risk == "high":
-            number = 4
-        return color, number  # Grey (default/unknown)
\ No newline at end of file
+        try:
+            return DoxxingAnalysis.from_dict(self._tool_input(response)).to_dict()
+        except ValueError as e:
+            with open("missed.txt", "a") as f:
+                f.write(json.dumps(self._tool_input(response)) + "\n\n")
+            print(f"❌ Invalid analysis from Claude ({e}); added to missed.txt")
+            return self._failed_analysis(e)
+
+    def _tool_input(self, response):
+        for block in response.content:
+            if block.type == "tool_use":
+                return block.input
+        return None
+
+# The response processor is shared by all backends
+ProcessingClaudeResponse = ProcessingDoxxingResponse
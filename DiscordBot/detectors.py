@@ -0,0 +1,408 @@
+# detectors.py
+import asyncio
+import copy
+from abc import ABC, abstractmethod
+import importlib
+import math
+import time
+from collections import deque
+import discord
+from datetime import datetime
+from supabase_helper import victim_score
+from report_record import ReportRecord, combined_score
+
+# Built-in backends, imported only when selected so a missing SDK or credential
+# for one provider does not stop the bot from running on the other
+DETECTOR_BACKENDS = {
+    "claude": ("claude_detector", "ClaudeDoxxingDetector"),
+    "gemini": ("gemini_detector", "GeminiDoxxingDetector"),
+}
+
+
+def register_detector(name: str, module: str, class_name: str):
+    """
+    Adds a detector backend that create_detector can build by name.
+    """
+    DETECTOR_BACKENDS[name] = (module, class_name)
+
+
+def create_detector(name: str, **options):
+    """
+    Builds the detector backend registered under name, passing options to its constructor.
+    """
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend {name!r}, expected one of {sorted(DETECTOR_BACKENDS)}")
+    module, class_name = DETECTOR_BACKENDS[name]
+    return getattr(importlib.import_module(module), class_name)(**options)
+
+
+class DoxxingDetector(ABC):
+    """
+    Interface shared by every detector backend. Backends must implement analyze_for_doxxing and
+    analyze_for_doxxing_async (a backend missing either cannot be created) and return analysis
+    dicts in the shape of DoxxingAnalysis.to_dict(); the batched, streaming and detailed entry
+    points fall back to the plain async call. Backends set self.cache (a VerdictCache) and self._in_flight ({}) to use _cached_analysis.
+    """
+    name = "detector"
+
+    @abstractmethod
+    def analyze_for_doxxing(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Analyze a message, blocking until the analysis is in.
+        """
+
+    @abstractmethod
+    async def analyze_for_doxxing_async(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Analyze a message without blocking the event loop.
+        """
+
+    async def analyze_for_doxxing_batched(self, message_id, message_content: str, author_name: str = "Unknown"):
+        return await self.analyze_for_doxxing_async(message_content, author_name)
+
+    async def analyze_for_doxxing_stream(self, message_content: str, author_name: str = "Unknown", on_verdict=None):
+        """
+        Backends that cannot stream run on_verdict once the whole analysis is in.
+        """
+        analysis = await self.analyze_for_doxxing_async(message_content, author_name)
+        if on_verdict is not None and not analysis.get('analysis_failed'):
+            await on_verdict({field: analysis[field] for field in ('is_doxxing', 'probability_of_doxxing', 'risk_level') if field in analysis})
+        return analysis
+
+    async def detailed_analysis_async(self, message_content: str, author_name: str = "Unknown"):
+        return await self.analyze_for_doxxing_async(message_content, author_name)
+
+    async def keep_warm(self):
+        """
+        Keeps any provider-side prompt cache warm until cancelled. Backends without one return immediately.
+        """
+        return
+
+    async def _cached_analysis(self, message_content: str, author_name: str, analyze, variant: str = ""):
+        """
+        Serve the verdict from the cache, or share an identical in-flight request, or run analyze().
+        """
+        key = self.cache.key_for(message_content, author_name) + variant
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if key in self._in_flight:
+            shared = self._in_flight[key]
+            try:
+                analysis = await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # The caller that owned the request was cancelled (e.g. it lost a hedge); run our own
+                return await self._cached_analysis(message_content, author_name, analyze, variant)
+            return copy.deepcopy(analysis)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            analysis = await analyze()
+            if not analysis.get('analysis_failed') and not analysis.get('escalation_failed'):
+                self.cache.put(key, analysis)
+            future.set_result(analysis)
+            return analysis
+        except asyncio.CancelledError:
+            # Cancelling this caller must not look like an error to callers sharing the request
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Callers sharing the request see the exception; don't warn when there are none
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _failed_analysis(self, error):
+        return {
+            "is_doxxing": False,
+            "probability_of_doxxing": 0.0,
+            "reasoning": f"Analysis failed: {str(error)}",
+            "analysis_failed": True
+        }
+
+
+class HedgedDetector(DoxxingDetector):
+    """
+    Sends each message to the primary backend and, if it has not answered by the hedge deadline
+    (the primary's recent p95 latency), to the secondary as well. The first usable answer wins.
+    A primary that fails outright goes straight to the secondary.
+    """
+    name = "hedged"
+
+    def __init__(self, primary: DoxxingDetector, secondary: DoxxingDetector, percentile: float = 0.95,
+                 initial_deadline: float = 5.0, min_samples: int = 20, window: int = 200):
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        # Used until min_samples primary latencies have been seen
+        self.initial_deadline = initial_deadline
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window) # Recent primary latencies in seconds
+        self.counters = {"requests": 0, "hedged": 0, "secondary_wins": 0, "fallbacks": 0}
+        # Primary calls that lost the race still finish, so their latency is recorded
+        self._stragglers = set()
+
+    def analyze_for_doxxing(self, message_content: str, author_name: str = "Unknown"):
+        analysis = self.primary.analyze_for_doxxing(message_content, author_name)
+        if analysis.get('analysis_failed'):
+            self.counters["fallbacks"] += 1
+            return self.secondary.analyze_for_doxxing(message_content, author_name)
+        return analysis
+
+    async def analyze_for_doxxing_async(self, message_content: str, author_name: str = "Unknown"):
+        return await self._hedged(lambda detector: detector.analyze_for_doxxing_async(message_content, author_name))
+
+    async def detailed_analysis_async(self, message_content: str, author_name: str = "Unknown"):
+        return await self._hedged(lambda detector: detector.detailed_analysis_async(message_content, author_name))
+
+    async def keep_warm(self):
+        await asyncio.gather(self.primary.keep_warm(), self.secondary.keep_warm())
+
+    def hedge_deadline(self):
+        """
+        Seconds to wait on the primary before hedging: the configured percentile of its recent latencies.
+        """
+        if len(self.latencies) < self.min_samples:
+            return self.initial_deadline
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(self.percentile * len(ordered)) - 1)]
+
+    async def _timed(self, call):
+        start = time.monotonic()
+        analysis = await call
+        if not analysis.get('analysis_failed'):
+            self.latencies.append(time.monotonic() - start)
+        return analysis
+
+    async def _hedged(self, call):
+        self.counters["requests"] += 1
+        primary = asyncio.create_task(self._timed(call(self.primary)))
+        done, pending = await asyncio.wait({primary}, timeout=self.hedge_deadline())
+        if done:
+            analysis = primary.result()
+            if not analysis.get('analysis_failed'):
+                return analysis
+            self.counters["fallbacks"] += 1
+            return await call(self.secondary)
+
+        self.counters["hedged"] += 1
+        secondary = asyncio.create_task(call(self.secondary))
+        pending = {primary, secondary}
+        analysis = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                analysis = task.result()
+                if analysis.get('analysis_failed'):
+                    continue
+                if task is secondary:
+                    self.counters["secondary_wins"] += 1
+                    self._stragglers.add(primary)
+                    primary.add_done_callback(self._stragglers.discard)
+                else:
+                    secondary.cancel()
+                return analysis
+        # Both backends failed
+        return analysis
+
+    def hedge_stats(self):
+        return {**self.counters, "deadline": self.hedge_deadline(), "samples": len(self.latencies)}
+
+
+class ProcessingDoxxingResponse:
+    """
+    Turns an analysis dict from any detector backend into the moderator embed and detailed report.
+    """
+    def __init__(self, analysis, message):
+        self.analysis = analysis
+        self.message = message
+        self.record = None # ReportRecord for the review queue (medium confidence only)
+
+    def format_bot_response(self):
+        """
+        Format the detailed doxxing analysis for display. Three return variables:
+            embed - the embed that should be sent to the moderator channel with a summary of response (None if no doxxing)
+            bot_report - string with details of bot's decision making process (None if no doxxing)
+            risk - bot's assessment of risk, represented as an integer (None if no doxxing or >84% confidence of doxxing)
+            confidence - bot's confidence in doxxing assessment (None if no doxxing)
+        """
+        
+        if not self.analysis.get('is_doxxing', False):
+            return None, None, None, None, None
+        
+        # Extract key information - support both probability_of_doxxing and confidence
+        confidence = float(self.analysis.get('probability_of_doxxing', self.analysis.get('confidence', 0)))
+        risk_level = self.analysis.get('risk_level', 'UNKNOWN')
+        
+        # Target information
+        target_info = self.analysis.get('target_analysis', {})
+        who_doxxed = target_info.get('who_was_doxxed', 'Unknown person')
+        
+        # What information was shared
+        info_disclosed = self.analysis.get('information_disclosed', {})
+        info_types = info_disclosed.get('info_types_found', [])
+        
+        # Context and intent
+        context = self.analysis.get('context_analysis', {})
+        harm_level = context.get('potential_harm_level', 'unknown')
+
+        bot_report = self.format_detailed_report()
+
+        # High confidence: post will be automatically deleted
+        if confidence > 0.7:
+            foo, risk_number = self._get_risk_values(risk_level.lower(), 0)
+            embed = discord.Embed(
+                title=f"Post Automatically Removed for Doxxing: {risk_level} Risk",
+                timestamp=datetime.now() # Timestamp of when the report was initiated
+            )
+        
+            embed.add_field(name="**Victim Name**", value=f"```{who_doxxed}```", inline=False)
+            embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
+
+            # If Doxxing info types were collected, add them to the embed
+            embed.add_field(name="**Doxxing Information Types Reported**", value=', '.join(info_types) if info_types else 'Various personal details', inline=False)
+                
+            embed.add_field(name="**Harm Assessment**", value=harm_level.title(), inline=False)
+
+            embed.add_field(name="**Result**", value="✅ **Automatic Action Taken:** Message deleted and user notified.", inline=False)
+                        
+            return embed, bot_report.strip(), risk_number, confidence, None
+        
+        # Medium confidence: post will be sent for manual review
+        if confidence >= 0.5:
+            doxxing_score = 0
+            if who_doxxed != "Unknown":
+                doxxing_score = victim_score(who_doxxed)
+
+            embed_color, risk_number = self._get_risk_values(risk_level.lower(), doxxing_score)
+
+            self.record = ReportRecord.for_message(
+                self.message,
+                title=f"Added by Bot to Review Queue: {risk_level} Doxxing Risk, medium confidence",
+                risk=risk_number,
+                score=combined_score(doxxing_score, risk_number),
+                bot_flagged=True,
+                reason="Doxxing",
+                victim_name=who_doxxed,
+                info_types=info_types or ['Various personal details'],
+                harm=harm_level.title(),
+                color=embed_color
+            )
+            embed = self.record.to_embed()
+
+            return embed, bot_report.strip(), risk_number, confidence, doxxing_score
+        
+        return None, None, None, confidence, None
+    
+    def format_detailed_report(self):
+        """
+        Format the detailed doxxing analysis (the `-d` report) as a string. Does not need the message,
+        so it can be generated later from a stored analysis.
+        """
+        # Extract key information - support both probability_of_doxxing and confidence
+        confidence = float(self.analysis.get('probability_of_doxxing', self.analysis.get('confidence', 0)))
+        risk_level = self.analysis.get('risk_level', 'UNKNOWN')
+        
+        # Target information
+        target_info = self.analysis.get('target_analysis', {})
+        who_doxxed = target_info.get('who_was_doxxed', 'Unknown person')
+        relationship = target_info.get('relationship_to_author', 'unknown')
+        
+        # What information was shared
+        info_disclosed = self.analysis.get('information_disclosed', {})
+        info_types = info_disclosed.get('info_types_found', [])
+        sensitive_details = info_disclosed.get('sensitive_details', [])
+        
+        # Context and intent
+        context = self.analysis.get('context_analysis', {})
+        intent = context.get('apparent_intent', 'unclear')
+        harm_level = context.get('potential_harm_level', 'unknown')
+        
+        # Moderator summary
+        mod_summary = self.analysis.get('moderator_summary', {})
+        primary_concern = mod_summary.get('primary_concern', 'Privacy violation detected')
+        reasoning = mod_summary.get('reasoning', 'No detailed reasoning provided')
+        action = mod_summary.get('recommended_action', 'review_needed')
+
+        # Create a user-friendly list of what was detected
+        detected_info = []
+        type_mapping = {
+            'phone': 'phone number',
+            'email': 'email address', 
+            'address': 'address',
+            'real_name': 'personal name',
+            'financial': 'financial information',
+            'government_id': 'ID information',
+            'social_media': 'social media account',
+            'workplace': 'workplace information'
+        }
+        
+        for info_type in info_types:
+            if info_type in type_mapping:
+                detected_info.append(type_mapping[info_type])
+            else:
+                detected_info.append(info_type.replace('_', ' '))
+        
+        # Format the detected info nicely
+        print(detected_info)
+        if len(detected_info) == 1:
+            info_text = detected_info[0]
+        elif len(detected_info) == 2:
+            info_text = f"{detected_info[0]} and {detected_info[1]}"
+        elif len(detected_info) > 0:
+            info_text = f"{', '.join(detected_info[:-1])}, and {detected_info[-1]}"
+        else:
+            info_text = ""
+        
+        # Format the report
+        bot_report = f"""
+    **🚨 DOXXING DETECTED - {risk_level} RISK**
+
+    **👤 Target:** {who_doxxed} ({relationship} to author)
+    **📊 Probability:** {confidence * 100}%
+    **⚠️ Primary Concern:** {primary_concern}
+
+    **📋 Information Exposed:**
+    • Types: {info_text}
+    • Sensitive Details: {', '.join(sensitive_details) if sensitive_details else 'See message content'}
+
+    **🎯 Context Analysis:**
+    • Intent: {intent.title()}
+    • Harm Level: {harm_level.title()}
+
+    **🤖 AI Analysis:** {reasoning}
+
+    **✅ Recommended Action:** {action.replace('_', ' ').title()}
+        """
+
+        return bot_report.strip()
+
+    def _get_risk_values(self, risk, doxxing_score):
+        """
+        Return a color based on the AI bot's risk level and doxxing score.
+        Return number based on AI bot's risk level.
+        """
+        color = 0x95a5a6
+        number = 1
+        if risk == "minimal" or (doxxing_score > 0 and doxxing_score < 10):
+            color = 0x3498db   # Blue
+        elif risk == "low" or doxxing_score < 30:
+            color = 0xf1c40f   # Yellow
+        elif risk == "medium" or doxxing_score < 50:
+            color = 0xe67e22   # Orange
+        elif risk == "high" or doxxing_score > 0:
+            color = 0xe74c3c   # Red
+        if risk == "minimal":
+            number = 1
+        elif risk == "Low":
+            number = 2
+        elif risk == "medium":
+            number = 3
+        elif risk == "high":
+            number = 4
+        return color, number  # Grey (default/unknown)
\ No newline at end of file
@@ -1,14 +1,26 @@
 # gemini_detector.py
 import json
 import os
+import asyncio
 import vertexai
 from vertexai.generative_models import GenerativeModel
-import discord
-from datetime import datetime
-from supabase_helper import victim_score
-
-class GeminiDoxxingDetector:
-    def __init__(self, project_id: str, location: str = "us-central1"):
+from ttl_cache import VerdictCache
+from analysis_schema import DoxxingAnalysis
+from detectors import DoxxingDetector, ProcessingDoxxingResponse
+
+class GeminiDoxxingDetector(DoxxingDetector):
+    name = "gemini"
+
+    # Maximum deterministic settings
+    GENERATION_CONFIG = {
+        "temperature": 0.0,        # Completely deterministic
+        "top_p": 0.1,             # Very restricted token selection
+        "top_k": 1,               # Only most likely token
+        "max_output_tokens": 2048,
+        "candidate_count": 1      # Single response only
+    }
+
+    def __init__(self, project_id: str, location: str = "us-central1", cache: VerdictCache = None, max_concurrency: int = 8):
         # Set up Google Cloud credentials
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'google-credentials.json'
         
@@ -17,15 +29,51 @@ class GeminiDoxxingDetector:
         
         # Load Gemini model
         self.model = GenerativeModel("gemini-2.0-flash-001")
+
+        # Caps the number of Gemini calls in flight at once from the bot
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Verdicts for recently seen content, so reposts skip the LLM
+        self.cache = cache if cache is not None else VerdictCache()
+        self._in_flight = {} # cache key -> future
         
         print(f"✅ Gemini detector initialized for project: {project_id}")
     
     def analyze_for_doxxing(self, message_content: str, author_name: str = "Unknown"):
         """
-        Analyze a Discord message for doxxing using Gemini AI
+        Analyze a Discord message for doxxing using Gemini AI (blocking)
         """
-        
-        prompt = f"""You are a content moderator with experience in detecting doxxing, harassment, and privacy violations across social platforms. You understand the nuanced difference between legitimate information sharing and malicious doxxing.
+        key = self.cache.key_for(message_content, author_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = self.model.generate_content(self._build_prompt(message_content, author_name), generation_config=self.GENERATION_CONFIG)
+        except Exception as e:
+            print(f"❌ Error calling Gemini: {e}")
+            return self._failed_analysis(e)
+        analysis = self._parse_response(response)
+        if not analysis.get('analysis_failed'):
+            self.cache.put(key, analysis)
+        return analysis
+
+    async def analyze_for_doxxing_async(self, message_content: str, author_name: str = "Unknown"):
+        """
+        Analyze a Discord message for doxxing using Gemini without blocking the event loop.
+        """
+        async def analyze():
+            try:
+                async with self._semaphore:
+                    response = await self.model.generate_content_async(self._build_prompt(message_content, author_name), generation_config=self.GENERATION_CONFIG)
+            except Exception as e:
+                print(f"❌ Error calling Gemini: {e}")
+                return self._failed_analysis(e)
+            return self._parse_response(response)
+        return await self._cached_analysis(message_content, author_name, analyze)
+
+    def _build_prompt(self, message_content: str, author_name: str):
+        return f"""You are a content moderator with experience in detecting doxxing, harassment, and privacy violations across social platforms. You understand the nuanced difference between legitimate information sharing and malicious doxxing.
 
 
 ANALYZE THIS DISCORD MESSAGE FOR DOXXING:
@@ -265,19 +313,11 @@ Respond with ONLY valid JSON:
     }}
 }}"""
 
+    def _parse_response(self, response):
+        """
+        Turn Gemini's JSON text into a validated analysis dict.
+        """
         try:
-            # Call Gemini with maximum deterministic settings
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0.0,        # Completely deterministic
-                    "top_p": 0.1,             # Very restricted token selection
-                    "top_k": 1,               # Only most likely token
-                    "max_output_tokens": 2048,
-                    "candidate_count": 1      # Single response only
-                }
-            )
-            
             # Clean up response
             result_text = response.text.strip()
             if '```json' in result_text:
@@ -285,191 +325,15 @@ Respond with ONLY valid JSON:
             elif '```' in result_text:
                 result_text = result_text.split('```')[1].strip()
             
-            # Parse JSON
-            analysis = json.loads(result_text)
-            
-            # Ensure probability_of_doxxing is between 0 and 1
-            if 'probability_of_doxxing' in analysis:
-                analysis['probability_of_doxxing'] = max(0.0, min(1.0, float(analysis['probability_of_doxxing'])))
-            
-            # Add confidence field for backward compatibility
-            analysis['confidence'] = analysis.get('probability_of_doxxing', 0.0)
-            
-            return analysis
-            
-        except Exception as e:
-            print(f"❌ Error calling Gemini: {e}")
-            return {
-                "is_doxxing": False,
-                "probability_of_doxxing": 0.0,
-                "confidence": 0.0,
-                "reasoning": f"Analysis failed: {str(e)}"
-            }
-
-class ProcessingGeminiResponse:
-    def __init__(self, analysis, message):
-        self.analysis = analysis
-        self.message = message
-
-    def format_bot_response(self):
-        """
-        Format the detailed doxxing analysis for display. Three return variables:
-            embed - the embed that should be sent to the moderator channel with a summary of response (None if no doxxing)
-            bot_report - string with details of bot's decision making process (None if no doxxing)
-            risk - bot's assessment of risk, represented as an integer (None if no doxxing or >84% confidence of doxxing)
-            confidence - bot's confidence in doxxing assessment (None if no doxxing)
-        """
-        
-        if not self.analysis.get('is_doxxing', False):
-            return None, None, None, None, None
-        
-        # Extract key information - support both probability_of_doxxing and confidence
-        confidence = float(self.analysis.get('probability_of_doxxing', self.analysis.get('confidence', 0)))
-        risk_level = self.analysis.get('risk_level', 'UNKNOWN')
-        
-        # Target information
-        target_info = self.analysis.get('target_analysis', {})
-        who_doxxed = target_info.get('who_was_doxxed', 'Unknown person')
-        relationship = target_info.get('relationship_to_author', 'unknown')
+            # Parse and validate JSON (clamps probability_of_doxxing to [0, 1])
+            analysis = DoxxingAnalysis.from_dict(json.loads(result_text)).to_dict()
+        except ValueError as e:
+            print(f"❌ Invalid analysis from Gemini ({e})")
+            return self._failed_analysis(e)
         
-        # What information was shared
-        info_disclosed = self.analysis.get('information_disclosed', {})
-        info_types = info_disclosed.get('info_types_found', [])
-        sensitive_details = info_disclosed.get('sensitive_details', [])
-        
-        # Context and intent
-        context = self.analysis.get('context_analysis', {})
-        intent = context.get('apparent_intent', 'unclear')
-        harm_level = context.get('potential_harm_level', 'unknown')
-        
-        # Moderator summary
-        mod_summary = self.analysis.get('moderator_summary', {})
-        primary_concern = mod_summary.get('primary_concern', 'Privacy violation detected')
-        reasoning = mod_summary.get('reasoning', 'No detailed reasoning provided')
-        action = mod_summary.get('recommended_action', 'review_needed')
-
-        # Create a user-friendly list of what was detected
-        detected_info = []
-        type_mapping = {
-            'phone': 'phone number',
-            'email': 'email address', 
-            'address': 'address',
-            'real_name': 'personal name',
-            'financial': 'financial information',
-            'government_id': 'ID information',
-            'social_media': 'social media account',
-            'workplace': 'workplace information'
-        }
-        
-        for info_type in info_types:
-            if info_type in type_mapping:
-                detected_info.append(type_mapping[info_type])
-            else:
-                detected_info.append(info_type.replace('_', ' '))
-        
-        # Format the detected info nicely
-        if len(detected_info) == 1:
-            info_text = detected_info[0]
-        elif len(detected_info) == 2:
-            info_text = f"{detected_info[0]} and {detected_info[1]}"
-        else:
-            info_text = f"{', '.join(detected_info[:-1])}, and {detected_info[-1]}"
-        
-        # Format the report
-        bot_report = f"""
-    **🚨 DOXXING DETECTED - {risk_level} RISK**
-
-    **👤 Target:** {who_doxxed} ({relationship} to author)
-    **📊 Probability:** {confidence * 100}%
-    **⚠️ Primary Concern:** {primary_concern}
-
-    **📋 Information Exposed:**
-    • Types: {info_text}
-    • Sensitive Details: {', '.join(sensitive_details) if sensitive_details else 'See message content'}
-
-    **🎯 Context Analysis:**
-    • Intent: {intent.title()}
-    • Harm Level: {harm_level.title()}
-
-    **🤖 AI Analysis:** {reasoning}
-
-    **✅ Recommended Action:** {action.replace('_', ' ').title()}
-        """
-
-        # High confidence: post will be automatically deleted
-        if confidence > 0.84:
-            foo, risk_number = self._get_risk_values(risk_level.lower(), 0)
-            embed = discord.Embed(
-                title=f"Post Automatically Removed for Doxxing: {risk_level} Risk",
-                timestamp=datetime.now() # Timestamp of when the report was initiated
-            )
-        
-            embed.add_field(name="**Victim Name**", value=f"```{who_doxxed}```", inline=False)
-            embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
+        # Add confidence field for backward compatibility
+        analysis['confidence'] = analysis['probability_of_doxxing']
+        return analysis
 
-            # If Doxxing info types were collected, add them to the embed
-            embed.add_field(name="**Doxxing Information Types Reported**", value=', '.join(info_types) if info_types else 'Various personal details', inline=False)
-                
-            embed.add_field(name="**Harm Assessment**", value=harm_level.title(), inline=False)
-
-            embed.add_field(name="**Result**", value="✅ **Automatic Action Taken:** Message deleted and user notified.", inline=False)
-                        
-            return embed, bot_report.strip(), risk_number, confidence, None
-        
-        # Medium confidence: post will be sent for manual review
-        if confidence >= 0.7:
-            doxxing_score = 0
-            if who_doxxed != "Unknown":
-                doxxing_score = victim_score(who_doxxed)
-
-            embed_color, risk_number = self._get_risk_values(risk_level.lower(), doxxing_score)
-
-            embed = discord.Embed(
-                title=f"Added by Bot to Review Queue: {risk_level} Doxxing Risk, medium confidence",
-                color=embed_color,
-                timestamp=datetime.now() # Timestamp of when the report was initiated
-            )
-
-            embed.add_field(name="**Content of Reported Message**", value=f"```{self.message.content[:1000]}```" + ("... (truncated)" if len(self.message.content) > 1000 else ""), inline=False)
-            embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
-            embed.add_field(name="**Filed By (Reporter)**", value=f"MODERATOR BOT", inline=True)
-
-            embed.add_field(name="**Specific Reason Provided by Reporter**", value="Doxxing", inline=False)
-            
-            embed.add_field(name="**Victim Name**", value=who_doxxed, inline=False)
-
-            embed.add_field(name="**Doxxing Information Types Reported**", value=', '.join(info_types) if info_types else 'Various personal details', inline=False)
-                
-            embed.add_field(name="**Harm Assessment**", value=harm_level.title(), inline=True)
-            embed.add_field(name="**Risk Level**", value=risk_number, inline=True)
-                
-            embed.add_field(name="**Direct Link to Reported Message**", value=f"[Click to View Message]({self.message.jump_url})", inline=False)
-
-            return embed, bot_report.strip(), risk_number, confidence, doxxing_score
-        
-        return None, None, None, confidence, None
-    
-    def _get_risk_values(self, risk, doxxing_score):
-        """
-        Return a color based on the AI bot's risk level and doxxing score.
-        Return number based on AI bot's risk level.
-        """
-        color = 0x95a5a6
-        number = 1
-        if risk == "minimal" or (doxxing_score > 0 and doxxing_score < 10):
-            color = 0x3498db   # Blue
-        elif risk == "low" or doxxing_score < 30:
-            color = 0xf1c40f   # Yellow
-        elif risk == "medium" or doxxing_score < 50:
-            color = 0xe67e22   # Orange
-        elif risk == "high" or doxxing_score > 0:
-            color = 0xe74c3c   # Red
-        if risk == "minimal":
-            number = 1
-        elif risk == "Low":
-            number = 2
-        elif risk == "medium":
-            number = 3
-        elif risk == "high":
-            number = 4
-        return color, number  # Grey (default/unknown)
\ No newline at end of file
+# The response processor is shared by all backends
+ProcessingGeminiResponse = ProcessingDoxxingResponse
@@ -0,0 +1,96 @@
+# outbox.py
+import json
+import sqlite3
+import time
+import uuid
+
+
+class Outbox:
+    """
+    Durable queue of database writes. Each write is recorded locally under a unique event ID
+    before it is attempted and only removed once the database has confirmed it, so nothing is
+    lost to a network error or a restart. Failed events are retried with exponential backoff.
+    An event moves through stages (kinds): a perpetrator row is first "perpetrators" (log insert)
+    and then "perpetrator_scores" (fold into the maintained score).
+    """
+    def __init__(self, path: str = "outbox.db", base_delay: float = 1.0, max_delay: float = 300.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("pragma journal_mode=wal")
+        self.connection.execute("pragma synchronous=normal")
+        with self.connection:
+            self.connection.execute(
+                "create table if not exists outbox ("
+                "event_id text primary key, kind text not null, row text not null, "
+                "attempts integer not null default 0, next_attempt_at real not null default 0, created_at real not null)"
+            )
+            self.connection.execute("create index if not exists outbox_due on outbox (kind, next_attempt_at)")
+
+    def add(self, kind: str, row: dict):
+        """
+        Records a write and returns its event ID, which is also stored on the row for deduplication.
+        """
+        event_id = str(uuid.uuid4())
+        row = {**row, "event_id": event_id}
+        with self.connection:
+            self.connection.execute(
+                "insert into outbox (event_id, kind, row, created_at) values (?, ?, ?, ?)",
+                (event_id, kind, json.dumps(row), time.time())
+            )
+        return event_id, row
+
+    def due(self, kind: str, limit: int = 500):
+        """
+        Events of this kind whose next attempt is due, oldest first, as (event_id, row) pairs.
+        """
+        rows = self.connection.execute(
+            "select event_id, row from outbox where kind = ? and next_attempt_at <= ? order by created_at limit ?",
+            (kind, time.time(), limit)
+        )
+        return [(event_id, json.loads(row)) for event_id, row in rows]
+
+    def rows(self, kind: str):
+        """
+        Every waiting row of this kind, due or not.
+        """
+        return [json.loads(row) for (row,) in self.connection.execute("select row from outbox where kind = ?", (kind,))]
+
+    def advance(self, event_ids: list, kind: str):
+        """
+        Moves events to their next stage, due immediately.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "update outbox set kind = ?, attempts = 0, next_attempt_at = 0 where event_id = ?",
+                [(kind, event_id) for event_id in event_ids]
+            )
+
+    def done(self, event_ids: list):
+        with self.connection:
+            self.connection.executemany("delete from outbox where event_id = ?", [(event_id,) for event_id in event_ids])
+
+    def retry_later(self, event_ids: list):
+        """
+        Schedules another attempt after base_delay * 2^attempts seconds (at most max_delay).
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "update outbox set attempts = attempts + 1, "
+                "next_attempt_at = ? + min(?, ? * (1 << min(attempts, 20))) where event_id = ?",
+                [(now, self.max_delay, self.base_delay, event_id) for event_id in event_ids]
+            )
+
+    def backlog(self):
+        """
+        Waiting events per kind, how many have failed at least once, and the age of the oldest in seconds.
+        """
+        by_kind = dict(self.connection.execute("select kind, count(*) from outbox group by kind").fetchall())
+        failing, oldest = self.connection.execute("select count(*) filter (where attempts > 0), min(created_at) from outbox").fetchone()
+        return {
+            "pending": sum(by_kind.values()),
+            "by_kind": by_kind,
+            "failing": failing,
+            "oldest_seconds": time.time() - oldest if oldest is not None else 0.0,
+        }
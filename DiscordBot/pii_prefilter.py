@@ -0,0 +1,251 @@
+# pii_prefilter.py
+import re
+
+# Hard identifiers: the categories the Claude prompt lists as always-disallowed or high risk
+SSN_PATTERN = re.compile(r'\b(?!000|666|9\d\d)\d{3}([- ])(?!00)\d{2}\1(?!0000)\d{4}\b')
+CARD_PATTERN = re.compile(r'\b\d(?:[ -]?\d){12,18}\b')
+BANK_ACCOUNT_PATTERN = re.compile(r'\b(?:bank|acct|account|routing|iban)\b\D{0,30}(\d[\d -]{5,20}\d)', re.IGNORECASE)
+ROUTING_NUMBER_PATTERN = re.compile(r'\b(?:routing|aba|rtn)\b\D{0,30}\b(\d{9})\b', re.IGNORECASE)
+IBAN_PATTERN = re.compile(r'\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,4})?\b')
+PHONE_PATTERN = re.compile(r'(?<![\w-])(?:\+?1[ .-]?)?(?:\(\d{3}\)\s?|\d{3}[ .-])?\d{3}[ .-]\d{4}(?![\w-])|\b\d{3}-[A-Z]{4}\b')
+EMAIL_PATTERN = re.compile(r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b')
+STREET_ADDRESS_PATTERN = re.compile(
+    r'\b\d{1,6}[A-Za-z]?\s+(?:[NSEW]\.?\s+)?(?:[A-Za-z0-9]+\s+){0,3}'
+    r'(?:st|street|ave|avenue|rd|road|blvd|boulevard|dr|drive|ln|lane|way|ct|court|pl|place|'
+    r'ter|terrace|pkwy|parkway|hwy|highway|cir|circle|sq|square|trl|trail)\b\.?',
+    re.IGNORECASE
+)
+UNIT_PATTERN = re.compile(r'\b(?:apt|apartment|unit|suite|room|rm)\.?\s*#?\s*\w*\d\w*\b', re.IGNORECASE)
+ZIP_CODE_PATTERN = re.compile(r'\b\d{5}(?:-\d{4})?\b')
+
+# Softer signals: things that can point at a person without a hard identifier
+SOCIAL_HANDLE_PATTERN = re.compile(r'(?<![\w@])@\w{2,}')
+LINK_PATTERN = re.compile(r'\bhttps?://\S+|\bwww\.\S+', re.IGNORECASE)
+# Cues that a message is about where a specific person is, how to reach them or something private
+# about them. Everyday words ("every", "name", "post") are left out so ordinary chatter skips the LLM.
+CONTEXT_KEYWORD_PATTERN = re.compile(
+    r'\b(?:'
+    # Where someone lives or can be found
+    r'addre\w*|home address|house|apartment|located|location|neighbou?r\w*|street|'
+    r'where (?:to find|\w+ (?:lives?|works?|stays?|sleeps?|parks?|hangs? out))|'
+    r'li?ves? (?:right )?(?:at|on|in|near|next to|by|across)|(?:he|she|they)(?:\'s| is| are)? at|'
+    r'found (?:him|her|them)|flight|airport|funeral|cemeter\w*|'
+    # How to reach them
+    r'phone|cell|email\w*|contact\w*|'
+    # Government, financial and legal records
+    r'ssn|social security|passport|licen[cs]e|plate|dob|birthday|birth ?date|born|birth certificate|maiden name|'
+    r'bank\w*|account|credit|debit|loans?|savings|salary|six figures|tax\w*|lease|disability|'
+    r'probation|parole|dui|arrest\w*|court|plea|witness|ankle|prison|jail|bankrupt\w*|divorce|custody|'
+    r'illegal\w*|undocumented|'
+    # Health
+    r'doctor|therap\w*|hospital|clinic|diagnos\w*|medical|medication|prescription|patient|'
+    r'diabet\w*|depression|hiv|cancer|psych\w*|autis\w*|adhd|pregnan\w*|disorder|rehab|birthmark|'
+    # Work, school and routines
+    r'works? at|job|workplace|employer|boss|office|shift|after work|school|elementary|campus|college|university|'
+    r'schedule|route|commute|gym|fitness|every (?:day|night|morning|evening|week\w*|mon|tue|wed|thu|fri|sat|sun)\w*|'
+    # Family and identity
+    r'kids?|wife|husband|daughter|children|outed|closeted|identify|identity|'
+    # Exposing or going after someone
+    r'real name|full name|dox\w*|leak\w*|expos\w*|reveal\w*|track\w*|hunt|'
+    r'(?:get|show|report|grab) (?:him|her|them)|show up|pull up|confront|swat\w*|nudes?'
+    r')\b',
+    re.IGNORECASE
+)
+# Digits that could be an identifier even when written without separators or split up
+LONG_NUMBER_PATTERN = re.compile(r'\d{7,}|(?:\d+\D{1,8}){2,}\d+')
+COORDINATES_PATTERN = re.compile(r'-?\d{1,3}\.\d{3,},?\s+-?\d{1,3}\.\d{3,}')
+HOUSE_NUMBER_PATTERN = re.compile(r'\b\d{1,6}\s+[A-Z][a-z]+')
+# Undo common character swaps used to slip past filters ("l1ves at 195 third str33t")
+DEOBFUSCATION = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "$": "s", "@": "a", "7": "t"})
+
+# A capitalised word that does not start a sentence is usually a name or a place
+PROPER_NOUN_PATTERN = re.compile(r'(?<=[a-z,;:]\s)[A-Z][a-z]+|(?<=[a-z,;:]\s\s)[A-Z][a-z]+')
+
+# Categories that are certain enough to act on without waiting for the LLM. A bank account number
+# has no checksum, so it is only a signal; card numbers need an issuer prefix and length as well as
+# the Luhn check, and IBANs and routing numbers must pass their checksums.
+CERTAIN_CATEGORIES = {"ssn", "credit_card", "iban", "routing_number"}
+
+# Prefilter categories mapped onto the info_types used by the Claude prompt
+INFO_TYPES = {
+    "ssn": "government_id",
+    "credit_card": "financial",
+    "bank_account": "financial",
+    "iban": "financial",
+    "routing_number": "financial",
+    "phone": "phone",
+    "email": "email",
+    "address": "address",
+    "zip_code": "address",
+}
+
+
+def luhn_valid(number: str):
+    """
+    Returns whether a string of digits passes the Luhn checksum used by card numbers.
+    """
+    total = 0
+    for i, digit in enumerate(reversed(number)):
+        value = int(digit)
+        if i % 2 == 1:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def card_issuer_valid(number: str):
+    """
+    Returns whether a string of digits has the prefix and length of a major card issuer
+    (Visa, Mastercard, American Express or Discover). Other numbers that pass the Luhn check, such as
+    Discord user, channel and message IDs, are only a signal.
+    """
+    if number.startswith("4"):
+        return len(number) in (13, 16, 19)
+    if 51 <= int(number[:2]) <= 55 or 2221 <= int(number[:4]) <= 2720:
+        return len(number) == 16
+    if number[:2] in ("34", "37"):
+        return len(number) == 15
+    if number.startswith(("6011", "65")):
+        return len(number) == 16
+    return False
+
+
+def iban_valid(iban: str):
+    """
+    Returns whether an IBAN (without spaces) passes its ISO 13616 mod-97 check.
+    """
+    if not 15 <= len(iban) <= 34:
+        return False
+    rearranged = iban[4:] + iban[:4]
+    return int("".join(str(int(c, 36)) for c in rearranged)) % 97 == 1
+
+
+def routing_number_valid(number: str):
+    """
+    Returns whether a 9-digit string is a well-formed ABA routing number (Federal Reserve prefix and checksum).
+    """
+    prefix = int(number[:2])
+    if not (prefix <= 12 or 21 <= prefix <= 32 or 61 <= prefix <= 72 or prefix == 80):
+        return False
+    d = [int(c) for c in number]
+    return (3 * (d[0] + d[3] + d[6]) + 7 * (d[1] + d[4] + d[7]) + d[2] + d[5] + d[8]) % 10 == 0
+
+
+class PrefilterResult:
+    def __init__(self, categories, sensitive_details):
+        self.categories = categories
+        self.sensitive_details = sensitive_details
+
+    @property
+    def has_signal(self):
+        """
+        False only when nothing in the message could possibly be PII. Those messages skip the LLM.
+        """
+        return bool(self.categories)
+
+    @property
+    def certain(self):
+        """
+        True when the message contains an identifier the policy never allows (fast path).
+        """
+        return bool(self.categories & CERTAIN_CATEGORIES)
+
+    def info_types(self):
+        return sorted({INFO_TYPES[c] for c in self.categories if c in INFO_TYPES})
+
+    def fast_path_analysis(self):
+        """
+        Analysis dict for a certain hit, in the same shape the Claude detector returns.
+        The prompt puts government and financial identifiers at 0.90-1.00 regardless of context.
+        """
+        return {
+            "is_doxxing": True,
+            "probability_of_doxxing": 0.95,
+            "risk_level": "HIGH",
+            "target_analysis": {
+                "who_was_doxxed": "Unknown",
+                "relationship_to_author": "unknown",
+                "is_public_figure": False,
+                "apparent_consent": "unknown"
+            },
+            "information_disclosed": {
+                "info_types_found": self.info_types(),
+                "specificity_level": "exact",
+                "sensitive_details": self.sensitive_details,
+                "partial_info": ""
+            },
+            "moderator_summary": {
+                "primary_concern": "Government or financial identifier posted, which is never allowed on our platform",
+                "immediate_risks": ["identity theft", "financial fraud"],
+                "reasoning": "Flagged by the local PII prefilter (pattern and checksum match) without an LLM call.",
+                "recommended_action": "remove_immediately",
+                "follow_up_needed": "Confirm the identifier is real and check the author for further posts"
+            }
+        }
+
+
+def prefilter(message_content: str):
+    """
+    Scans a message locally for PII signals before it is sent to the LLM.
+    """
+    categories = set()
+    sensitive_details = []
+
+    for match in SSN_PATTERN.finditer(message_content):
+        categories.add("ssn")
+        sensitive_details.append(f"social security number: {match.group(0)}")
+
+    for match in CARD_PATTERN.finditer(message_content):
+        digits = re.sub(r'\D', '', match.group(0))
+        if 13 <= len(digits) <= 19 and luhn_valid(digits):
+            if card_issuer_valid(digits):
+                categories.add("credit_card")
+                sensitive_details.append(f"card number: {match.group(0)}")
+            else:
+                categories.add("number")
+
+    for match in BANK_ACCOUNT_PATTERN.finditer(message_content):
+        digits = re.sub(r'\D', '', match.group(1))
+        if 6 <= len(digits) <= 17:
+            categories.add("bank_account")
+            sensitive_details.append(f"bank account number: {match.group(1)}")
+
+    for match in ROUTING_NUMBER_PATTERN.finditer(message_content):
+        if routing_number_valid(match.group(1)):
+            categories.add("routing_number")
+            sensitive_details.append(f"routing number: {match.group(1)}")
+
+    for match in IBAN_PATTERN.finditer(message_content):
+        if iban_valid(match.group(0).replace(" ", "")):
+            categories.add("iban")
+            sensitive_details.append(f"IBAN: {match.group(0)}")
+
+    simple_patterns = [
+        ("phone", PHONE_PATTERN, "phone"),
+        ("email", EMAIL_PATTERN, "email"),
+        ("address", STREET_ADDRESS_PATTERN, "address"),
+        ("address", UNIT_PATTERN, "unit"),
+        ("zip_code", ZIP_CODE_PATTERN, "zip code"),
+    ]
+    for category, pattern, label in simple_patterns:
+        for match in pattern.finditer(message_content):
+            categories.add(category)
+            sensitive_details.append(f"{label}: {match.group(0)}")
+
+    if SOCIAL_HANDLE_PATTERN.search(message_content):
+        categories.add("social_handle")
+    if LINK_PATTERN.search(message_content):
+        categories.add("link")
+    deobfuscated = message_content.translate(DEOBFUSCATION)
+    if CONTEXT_KEYWORD_PATTERN.search(message_content) or CONTEXT_KEYWORD_PATTERN.search(deobfuscated):
+        categories.add("context_keyword")
+    if LONG_NUMBER_PATTERN.search(message_content) or COORDINATES_PATTERN.search(message_content):
+        categories.add("number")
+    if HOUSE_NUMBER_PATTERN.search(message_content):
+        categories.add("address")
+    if PROPER_NOUN_PATTERN.search(message_content):
+        categories.add("proper_noun")
+
+    return PrefilterResult(categories, sensitive_details)
@@ -6,6 +6,7 @@ import asyncio
 from datetime import datetime
 from count import increment_harassment_count
 from supabase_helper import victim_score 
+from report_record import ReportRecord, combined_score
 
 class ReportType(Enum):
     FRAUD = "Fraud"
@@ -431,53 +432,36 @@ class Report:
             print(f"Report Log Error: Mod channel for guild {guild_id} not found. Cannot send report.")
             return
         
-        embed_color = self._get_severity_color()
-
-        embed = discord.Embed(
+        record = ReportRecord.for_message(
+            self.message,
             title=f"New User Report: {self.report_type.value}", # Main Type
-            color=embed_color, 
-            timestamp=self.timestamp # Timestamp of when the report was initiated
+            risk=self.severity,
+            score=self.get_report_score(),
+            reporter_ids=[self.reporter_id],
+            reason=self.report_sub_type,
+            victim_name=self.victim_name,
+            info_types=[it.value for it in self.info_types],
+            threat=bool(self.threat),
+            color=self._get_severity_color(),
+            created_at=self.timestamp # Timestamp of when the report was initiated
         )
-        
-        embed.add_field(name="**Content of Reported Message**", value=f"```{self.message.content[:1000]}```" + ("... (truncated)" if len(self.message.content) > 1000 else ""), inline=False)
-        embed.add_field(name="**Author of Reported Message**", value=f"{self.message.author.mention} (`{self.message.author.name}`, ID: `{self.message.author.id}`)", inline=True)
-        embed.add_field(name="**Filed By (Reporter)**", value=f"<@{self.reporter_id}>", inline=True)
-
-        if self.report_sub_type:
-            embed.add_field(name="**Specific Reason Provided by Reporter**", value=self.report_sub_type, inline=False)
-        
-        # Victim name if provided
-        if self.victim_name:
-            embed.add_field(name="**Victim Name**", value=self.victim_name, inline=False)
-
-        # If Doxxing info types were collected, add them to the embed
-        if self.info_types:
-            info_types_display_str = "\n".join([f"- {it.value}" for it in self.info_types])
-            embed.add_field(name="**Doxxing Information Types Reported**", value=info_types_display_str, inline=False)
-            
-        if self.threat: 
-            embed.add_field(name="**Threat Assessment (by Reporter)**", value="Yes (Reporter indicated 'Credible Threat of Violence' or similar sub-reason)", inline=False)
-        else:
-            embed.add_field(name="**Threat Assessment (by Reporter)**", value="No (Reporter's sub-reason did not indicate a direct credible threat)", inline=False)
-        embed.add_field(name="**Risk Level**", value=self.severity, inline=False)
-            
-        embed.add_field(name="**Direct Link to Reported Message**", value=f"[Click to View Message]({self.message.jump_url})", inline=False)
-        
-        embed.set_footer(text=f"Report ID (Timestamp): {self.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        embed = record.to_embed()
 
         # Increment harassment count if this report is of type HARASSMENT
         if self.report_type == ReportType.HARASSMENT:
             offender_id = self.message.author.id
             increment_harassment_count(guild_id, offender_id)
 
-        self.full_report = embed
+        self.full_report = record
 
         try:
             await mod_channel.send(embed=embed)
-            if self.client.reviewing_queue.empty():
-                await mod_channel.send(f"There is currently {self.client.reviewing_queue.qsize() + 1} report to review.")
+            # A report of an already queued message is merged into it rather than added
+            pending = self.client.reviewing_queue.qsize() + (not self.client.reviewing_queue.has_message(record.message_key))
+            if pending == 1:
+                await mod_channel.send(f"There is currently {pending} report to review.")
             else:
-                await mod_channel.send(f"There are currently {self.client.reviewing_queue.qsize() + 1} reports to review.")
+                await mod_channel.send(f"There are currently {pending} reports to review.")
             print(f"Report Log: Successfully sent report embed to mod channel '{mod_channel.name}' in guild '{mod_channel.guild.name}'.")
         except discord.Forbidden:
             print(f"Report Log Error: Failed to send report to '{mod_channel.name}' (Forbidden - check bot permissions).")
@@ -569,9 +553,6 @@ class Report:
     def get_report_score(self):
         """
         Aggregates post severity with doxxing score.
-        Multiplier effect if both numbers are non-zero.
         Determines rank in priority queue of reports.
         """
-        if self.doxxing_score == 0 or self.severity == 0:
-            return self.doxxing_score + self.severity
-        return self.doxxing_score * self.severity
\ No newline at end of file
+        return combined_score(self.doxxing_score, self.severity)
\ No newline at end of file
@@ -0,0 +1,145 @@
+# report_record.py
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import discord
+
+
+def combined_score(doxxing_score, severity):
+    """
+    Aggregates post severity with doxxing score. Multiplier effect if both numbers are non-zero.
+    The review queue ranks reports by 1 / this score (see ReportRecord.priority).
+    """
+    if doxxing_score == 0 or severity == 0:
+        return doxxing_score + severity
+    return doxxing_score * severity
+
+
+@dataclass(slots=True)
+class ReportRecord:
+    """
+    A report waiting in the review queue: the IDs needed to find the message and reporter, plus the
+    details a reviewer sees. The review queue stores these instead of embeds, so Review reads the
+    fields directly; the embed is only built (with to_embed) when the report is shown.
+    Reports of the same message are merged into one record (see merge), which lists every reporter;
+    bot_flagged is set if the bot flagged the message itself.
+    """
+    title: str
+    guild_id: int
+    channel_id: int
+    message_id: int
+    author_id: int
+    author_name: str
+    content: str
+    risk: int
+    score: float
+    reporter_ids: list = field(default_factory=list)
+    bot_flagged: bool = False
+    reason: str = None
+    victim_name: str = None
+    info_types: list = field(default_factory=list)
+    threat: bool = None # Reporter's threat assessment (user reports only)
+    harm: str = None # Bot's harm assessment (bot reports only)
+    color: int = None
+    ai_report_numbers: list = field(default_factory=list) # Keys of the bot's detailed reports in ai_reports
+    created_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def for_message(cls, message: discord.Message, **details):
+        """
+        A record of a report about message; details fill in the remaining fields.
+        """
+        return cls(
+            guild_id=message.guild.id,
+            channel_id=message.channel.id,
+            message_id=message.id,
+            author_id=message.author.id,
+            author_name=message.author.name,
+            content=message.content,
+            **details
+        )
+
+    @property
+    def message_key(self):
+        return (self.guild_id, self.channel_id, self.message_id)
+
+    @property
+    def report_count(self):
+        return len(self.reporter_ids) + self.bot_flagged
+
+    @property
+    def priority(self):
+        """
+        Review queue priority (lower is reviewed first). Each additional report of the message divides it.
+        """
+        return 1 / (self.score * max(self.report_count, 1))
+
+    def merge(self, other: "ReportRecord"):
+        """
+        Folds another report of the same message into this one. The record keeps the higher risk and
+        score and the earliest creation time, so it ages from the first report.
+        """
+        self.reporter_ids += [reporter_id for reporter_id in other.reporter_ids if reporter_id not in self.reporter_ids]
+        self.bot_flagged = self.bot_flagged or other.bot_flagged
+        if other.risk > self.risk:
+            self.title, self.color, self.risk = other.title, other.color, other.risk
+        self.score = max(self.score, other.score)
+        self.reason = self.reason or other.reason
+        if self.victim_name in (None, "Unknown"):
+            self.victim_name = other.victim_name or self.victim_name
+        self.info_types += [info_type for info_type in other.info_types if info_type not in self.info_types]
+        self.ai_report_numbers += [number for number in other.ai_report_numbers if number not in self.ai_report_numbers]
+        if other.threat is not None:
+            self.threat = bool(self.threat) or other.threat
+        self.harm = self.harm or other.harm
+        self.created_at = min(self.created_at, other.created_at)
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.message_id}"
+
+    def to_embed(self):
+        embed = discord.Embed(title=self.title, color=self.color, timestamp=self.created_at)
+
+        embed.add_field(name="**Content of Reported Message**", value=f"```{self.content[:1000]}```" + ("... (truncated)" if len(self.content) > 1000 else ""), inline=False)
+        embed.add_field(name="**Author of Reported Message**", value=f"<@{self.author_id}> (`{self.author_name}`, ID: `{self.author_id}`)", inline=True)
+        filed_by = [f"<@{reporter_id}>" for reporter_id in self.reporter_ids] + (["MODERATOR BOT"] if self.bot_flagged else [])
+        embed.add_field(name="**Filed By (Reporter)**", value=", ".join(filed_by), inline=True)
+        if self.report_count > 1:
+            embed.add_field(name="**Number of Reports**", value=self.report_count, inline=True)
+
+        if self.reason:
+            embed.add_field(name="**Specific Reason Provided by Reporter**", value=self.reason, inline=False)
+        if self.victim_name:
+            embed.add_field(name="**Victim Name**", value=self.victim_name, inline=False)
+        if self.info_types:
+            embed.add_field(name="**Doxxing Information Types Reported**", value="\n".join(f"- {info_type}" for info_type in self.info_types), inline=False)
+
+        if self.threat:
+            embed.add_field(name="**Threat Assessment (by Reporter)**", value="Yes (Reporter indicated 'Credible Threat of Violence' or similar sub-reason)", inline=False)
+        elif self.threat is not None:
+            embed.add_field(name="**Threat Assessment (by Reporter)**", value="No (Reporter's sub-reason did not indicate a direct credible threat)", inline=False)
+        if self.harm:
+            embed.add_field(name="**Harm Assessment**", value=self.harm, inline=True)
+        embed.add_field(name="**Risk Level**", value=self.risk, inline=self.harm is not None)
+
+        embed.add_field(name="**Direct Link to Reported Message**", value=f"[Click to View Message]({self.jump_url})", inline=False)
+        if self.reporter_ids:
+            embed.set_footer(text=f"Report ID (Timestamp): {self.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        return embed
+
+    def to_dict(self):
+        return {**asdict(self), "created_at": self.created_at.isoformat()}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Rebuilds a record saved with to_dict. Records saved before reports were merged have a single
+        reporter_id (None when the bot filed the report); unknown keys are ignored.
+        """
+        data = dict(data)
+        if "reporter_id" in data:
+            reporter_id = data.pop("reporter_id")
+            data.setdefault("reporter_ids", [reporter_id] if reporter_id is not None else [])
+            data.setdefault("bot_flagged", reporter_id is None)
+        known = {name: data[name] for name in cls.__dataclass_fields__ if name in data}
+        return cls(**{**known, "created_at": datetime.fromisoformat(data["created_at"])})
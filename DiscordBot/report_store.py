@@ -0,0 +1,66 @@
+# report_store.py
+import json
+import sqlite3
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class ReportStore(MutableMapping):
+    """
+    Map from report numbers to AI reports (a bot_report string, or a pending dict whose detailed
+    report has not been generated yet). Every entry is written to SQLite as compressed JSON;
+    only the max_entries most recently used stay in memory, so memory use stays flat however long
+    the bot runs, and `-d` lookups keep working after a restart.
+    """
+    def __init__(self, path: str = "bot_state.db", max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._recent = OrderedDict() # report number -> report, least recently used first
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("pragma journal_mode=wal")
+        with self.connection:
+            self.connection.execute("create table if not exists ai_reports (report_number integer primary key, report blob not null)")
+
+    def __getitem__(self, report_number):
+        if report_number in self._recent:
+            self._recent.move_to_end(report_number)
+            return self._recent[report_number]
+        row = self.connection.execute("select report from ai_reports where report_number = ?", (report_number,)).fetchone()
+        if row is None:
+            raise KeyError(report_number)
+        report = json.loads(zlib.decompress(row[0]))
+        self._remember(report_number, report)
+        return report
+
+    def __setitem__(self, report_number, report):
+        with self.connection:
+            self.connection.execute(
+                "insert or replace into ai_reports (report_number, report) values (?, ?)",
+                (report_number, zlib.compress(json.dumps(report).encode()))
+            )
+        self._remember(report_number, report)
+
+    def __delitem__(self, report_number):
+        with self.connection:
+            deleted = self.connection.execute("delete from ai_reports where report_number = ?", (report_number,)).rowcount
+        self._recent.pop(report_number, None)
+        if not deleted:
+            raise KeyError(report_number)
+
+    def __contains__(self, report_number):
+        if report_number in self._recent:
+            return True
+        return self.connection.execute("select 1 from ai_reports where report_number = ?", (report_number,)).fetchone() is not None
+
+    def __iter__(self):
+        for (report_number,) in self.connection.execute("select report_number from ai_reports order by report_number"):
+            yield report_number
+
+    def __len__(self):
+        return self.connection.execute("select count(*) from ai_reports").fetchone()[0]
+
+    def _remember(self, report_number, report):
+        self._recent[report_number] = report
+        self._recent.move_to_end(report_number)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
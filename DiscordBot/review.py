@@ -1,7 +1,6 @@
 # review.py
 from enum import Enum, auto
 import discord
-import re
 import asyncio
 from datetime import datetime, timedelta
 from supabase_helper import insert_victim_log, insert_perpetrator_log, get_perpetrator_score
@@ -58,7 +57,7 @@ class Review:
         self.timestamp = None
         self.victim_name = None
         self.guild_id = None
-        self.reporter = None
+        self.reporters = []
         
         # Assessment flags set by the reviewer for building a summary
         self.threat_identified_by_reviewer = False
@@ -88,7 +87,7 @@ class Review:
             self.state = State.REVIEW_COMPLETE
             if self.report:
                 reply += " The review you had in progress has been cancelled."
-                self.reports.put((self.priority, self.id, self.report))
+                self.reports.put_nowait((self.priority, self.id, self.report))
             reply += " Type the password to begin again."
             return [reply]
         
@@ -108,7 +107,7 @@ class Review:
             if len(tokens) > 1:
                 evaluation_id = int(message.content.split(" ")[1])
                 if evaluation_id in self.ai_reports:
-                    return [self.ai_reports[evaluation_id]]
+                    return [await self.client.get_ai_report(evaluation_id)]
                 return ["There is no bot report associated with that evaluation ID"]
             return[f"You must indicate an evaluation ID when requesting details in the form `{self.DETAILS_KEYWORD} [Evaluation ID]`"]
             
@@ -130,55 +129,37 @@ class Review:
             if message.content.lower().strip() == self.REVIEW_KEYWORD:
                 await message.author.send("Searching for reports...")
                 # Loops over PQ to find a report with a valid message to review
-                while not self.reports.empty():
+                while (full_entry := self.reports.claim()) is not None:
                     try:
-                        valid_message = False
-                        full_entry = self.reports.get(block=True, timeout=5)
-                        self.report = full_entry[2]
-                        self.priority = full_entry[0]
-                        self.id = full_entry[1]
-                        # Populate variables with report details
-                        for field in self.report.fields:
-
-                            # Examine link associated with report to ensure message still exists
-                            if field.name == "**Direct Link to Reported Message**": 
-                                match = re.search(r'\((.*?)\)', field.value)
-                                m = re.search(r'/(\d+)/(\d+)/(\d+)', match.group(1))
-                                if m:
-                                    self.guild_id, channel_id, message_id = map(int, m.groups())
-                                    try:
-                                        self.original_reported_message = await self.client.get_guild(self.guild_id).get_channel(channel_id).fetch_message(message_id)
-                                        valid_message = True
-                                    # Message was already deleted - program will move on to examine the next report without putting this back in the queue
-                                    except discord.errors.NotFound:
-                                        self.mod_channel = self.client.mod_channels.get(self.guild_id)
-                                        if mod_channel:
-                                            await self.mod_channel.send("A report was removed from the queue due to the post being deleted.")
-
-                            # Get reporter name to send updates once review is completed (non-bot reports only)
-                            if field.name == "**Filed By (Reporter)**":
-                                reporter = field.value
-                                if reporter != "MODERATOR BOT":
-                                    m = re.search(r'\d+', reporter)
-                                    self.reporter = await self.client.fetch_user(m[0])
-                            if field.name == "**Risk Level**":
-                                self.report_risk_level = int(field.value)
-                            
-                            # Store other report-specific variables
-                            if field.name == "**Specific Reason Provided by Reporter**":
-                                self.abuse_type = field.value
-                            if field.name == "**Victim Name**":
-                                self.victim_name = field.value
-                        if not valid_message:
-                            self.abuse_type = None
-                            self.victim_name = None
-                            self.reporter = None
-                            self.guild_id = None
-                            self.original_reported_message = None
+                        self.priority, self.id, self.report = full_entry
+
+                        # Ensure the reported message still exists
+                        try:
+                            self.original_reported_message = await self.client.get_guild(self.report.guild_id).get_channel(self.report.channel_id).fetch_message(self.report.message_id)
+                        # Message was already deleted - program will move on to examine the next report without putting this back in the queue
+                        except discord.errors.NotFound:
+                            self.mod_channel = self.client.mod_channels.get(self.report.guild_id)
+                            if self.mod_channel:
+                                await self.mod_channel.send("A report was removed from the queue due to the post being deleted.")
+                            self.report = None
                             continue
 
+                        # Populate variables with report details
+                        self.guild_id = self.report.guild_id
+                        self.report_risk_level = self.report.risk
+                        self.abuse_type = self.report.reason
+                        self.victim_name = self.report.victim_name
+                        # Get every reporter to send updates once review is completed (non-bot reports only)
+                        self.reporters = []
+                        for reporter_id in self.report.reporter_ids:
+                            try:
+                                self.reporters.append(await self.client.fetch_user(reporter_id))
+                            # Reporter's account is gone; the others are still notified
+                            except (discord.NotFound, discord.Forbidden):
+                                print(f"⚠️ Could not find reporter {reporter_id}; they will not be notified of the outcome")
+
                         # Valid report found; continue to ask about threats
-                        await message.author.send(embed=self.report)
+                        await message.author.send(embed=self.report.to_embed())
 
                         # Ask about threats if it won't be redundant to asking about the abuse type itself
                         if self.abuse_type != "Credible Threat of Violence":
@@ -196,8 +177,11 @@ class Review:
                         reply += f"2. No, this post does not contain {self.abuse_type.lower()}."
                         return [reply]
 
-                    # Race condition - PQ exhausted
+                    # Report could not be loaded; put it back so it is not lost
                     except Exception as e:
+                        print(f"❌ Could not load report {self.id} for review: {e}")
+                        self.reports.put_nowait(full_entry)
+                        self.report = None
                         reply = "All reports have been reviewed or are currently under review.\n"
                         reply += "You may do any of the following:\n"
                         reply += f"- Type `{self.HELP_KEYWORD}` to see a help message.\n"
@@ -420,6 +404,7 @@ If you are unsure, click on the message link to view the message in context befo
                     perpetrator_name = self.original_reported_message.author.display_name if self.original_reported_message and self.original_reported_message.author else None
                     if self.victim_name != "Unknown":
                         insert_victim_log(self.victim_name, self.timestamp, perpetrator_id, perpetrator_name)
+                        self.client.spawn(self.client.rescore_reports([self.victim_name]))
                 await message.author.send("Finalizing your review...")
                 await self._submit_report_to_mods()
                 self.state = State.REVIEW_COMPLETE
@@ -488,11 +473,18 @@ If you are unsure, click on the message link to view the message in context befo
             action_for_reporter += f"\n{original_content}\nThe moderation team does not believe your post falls under the category listed. No action was taken."
             actions_taken_summary_list.append("No automated actions (delete/suspend) triggered (e.g., no direct threat ID'd by reviewer).")
 
-        # Abuse detected. Send updates to reporter (if non-bot) and offender.
-        if self.reporter:
-            await self.reporter.send(action_for_reporter + " Thank you for your report.")
+        # Abuse detected. Send updates to every reporter (if non-bot) and offender.
+        for reporter in self.reporters:
+            try:
+                await reporter.send(action_for_reporter + " Thank you for your report.")
+            # Reporter has DMs closed or left; keep notifying the rest
+            except (discord.NotFound, discord.Forbidden):
+                print(f"⚠️ Could not notify reporter {reporter.id} of the review outcome")
         if action_for_offender:
-            await self.original_reported_message.author.send(action_for_offender + " Future offenses may result in further action taken against your account. We recommend reviewing our platform policies to ensure you avoid future violations.")
+            try:
+                await self.original_reported_message.author.send(action_for_offender + " Future offenses may result in further action taken against your account. We recommend reviewing our platform policies to ensure you avoid future violations.")
+            except (discord.NotFound, discord.Forbidden):
+                print(f"⚠️ Could not notify {self.original_reported_message.author} of the review outcome")
 
         return actions_taken_summary_list
 
@@ -0,0 +1,234 @@
+# review_queue.py
+import asyncio
+import heapq
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime
+from report_record import ReportRecord
+
+
+def record_from_embed(priority, embed: dict):
+    """
+    Rebuilds a ReportRecord from a report embed saved by earlier versions of the review queue
+    (the review_queue table). Returns None if the embed has no link to the reported message.
+    """
+    fields = {field["name"]: field["value"] for field in embed.get("fields", [])}
+    link = re.search(r'/(\d+)/(\d+)/(\d+)\)', fields.get("**Direct Link to Reported Message**", ""))
+    if not link:
+        return None
+    guild_id, channel_id, message_id = map(int, link.groups())
+    author = re.search(r'\(`(.*?)`, ID: `(\d+)`\)', fields.get("**Author of Reported Message**", ""))
+    reporter = fields.get("**Filed By (Reporter)**", "")
+    reporter_ids = [int(reporter_id) for reporter_id in re.findall(r'<@(\d+)>', reporter)]
+    info_types = fields.get("**Doxxing Information Types Reported**")
+    threat = fields.get("**Threat Assessment (by Reporter)**")
+    created_at = datetime.fromisoformat(embed["timestamp"]).astimezone().replace(tzinfo=None) if embed.get("timestamp") else datetime.now()
+    return ReportRecord(
+        title=embed.get("title", ""),
+        guild_id=guild_id,
+        channel_id=channel_id,
+        message_id=message_id,
+        author_id=int(author.group(2)) if author else 0,
+        author_name=author.group(1) if author else "",
+        content=fields.get("**Content of Reported Message**", "").strip("`"),
+        risk=int(fields.get("**Risk Level**", 0)),
+        score=1 / priority,
+        reporter_ids=reporter_ids,
+        bot_flagged="MODERATOR BOT" in reporter,
+        reason=fields.get("**Specific Reason Provided by Reporter**"),
+        victim_name=fields.get("**Victim Name**"),
+        info_types=[info_type.strip().removeprefix("- ") for info_type in re.split(r'\n|, ', info_types)] if info_types else [],
+        threat=threat.startswith("Yes") if threat else None,
+        harm=fields.get("**Harm Assessment**"),
+        color=embed.get("color"),
+        created_at=created_at
+    )
+
+
+class PersistentPriorityQueue(asyncio.PriorityQueue):
+    """
+    The review queue of (priority, id, ReportRecord) items, mirrored to SQLite so pending reports
+    survive restarts. It is an asyncio queue, so nothing ever blocks the event loop: add items with
+    put_nowait, pull them with claim() (or await get() to wait for the next one). Every put writes
+    the item and every pull deletes it. Also persists the counter that hands out report IDs, so IDs
+    are never reused after a restart.
+
+    Priorities age: a report's effective priority is its priority minus aging_rate per second it
+    has waited (since record.created_at), so low-risk reports cannot starve. All reports age at the
+    same rate, which makes the heap key priority + aging_rate * created_at fixed per report.
+    reprioritize() changes a queued report's priority by pushing a new versioned heap entry; the
+    outdated entry is skipped when it reaches the top.
+
+    Reports are indexed by message: putting a report of a message that is already queued merges it
+    into the queued item (see ReportRecord.merge) instead of adding a second one.
+    """
+    def __init__(self, path: str = "bot_state.db", maxsize: int = 0, aging_rate: float = 0.0):
+        self.path = path
+        self.aging_rate = aging_rate
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = [] # heap of (key, item id, version)
+        self._items = {} # item id -> (priority, record, version)
+        self._by_message = {} # (guild id, channel id, message id) -> item id
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("pragma journal_mode=wal")
+        with self.connection:
+            self.connection.execute("create table if not exists review_records (item_id integer primary key, priority real not null, record text not null)")
+            self.connection.execute("create table if not exists counters (name text primary key, value integer not null)")
+        # One query reloads the backlog; heappush keeps the original priority ordering
+        for priority, item_id, record in self.connection.execute("select priority, item_id, record from review_records").fetchall():
+            self._put((priority, item_id, ReportRecord.from_dict(json.loads(record))))
+        self._migrate_embeds()
+        if self._items:
+            print(f"📥 Restored {len(self._items)} pending reports to the review queue")
+
+    def _migrate_embeds(self):
+        """
+        Converts reports saved as embeds in the old review_queue table into records, then drops the table.
+        """
+        if not self.connection.execute("select 1 from sqlite_master where type = 'table' and name = 'review_queue'").fetchone():
+            return
+        skipped = 0
+        for priority, item_id, embed in self.connection.execute("select priority, item_id, embed from review_queue").fetchall():
+            record = record_from_embed(priority, json.loads(embed))
+            if record is None:
+                skipped += 1
+                print(f"⚠️ Could not convert queued report {item_id} from the old format; it was not restored: {embed}")
+                continue
+            if record.bot_flagged:
+                # The bot queued its reports under their AI report numbers
+                record.ai_report_numbers.append(item_id)
+            self._put((record.priority, item_id, record))
+        with self.connection:
+            self.connection.execute("drop table review_queue")
+        print(f"📥 Converted the old review queue to report records ({skipped} could not be converted)")
+
+    def _key(self, priority, record):
+        return priority + self.aging_rate * record.created_at.timestamp()
+
+    def _push(self, priority, item_id, record):
+        version = self._items[item_id][2] + 1 if item_id in self._items else 0
+        self._items[item_id] = (priority, record, version)
+        self._by_message[record.message_key] = item_id
+        heapq.heappush(self._queue, (self._key(priority, record), item_id, version))
+
+    def _save(self, priority, item_id, record):
+        with self.connection:
+            self.connection.execute(
+                "insert or replace into review_records (item_id, priority, record) values (?, ?, ?)",
+                (item_id, priority, json.dumps(record.to_dict()))
+            )
+
+    def _put(self, item):
+        priority, item_id, record = item
+        queued_id = self._by_message.get(record.message_key)
+        if queued_id is not None and queued_id != item_id:
+            # Another report of a queued message: fold it into the queued item, whose priority rises
+            queued = self._items[queued_id][1]
+            queued.merge(record)
+            with self.connection:
+                self.connection.execute("delete from review_records where item_id = ?", (item_id,))
+            priority, item_id, record = queued.priority, queued_id, queued
+        self._save(priority, item_id, record)
+        self._push(priority, item_id, record)
+
+    def _get(self):
+        # Skip entries left behind by reprioritize()
+        while True:
+            key, item_id, version = heapq.heappop(self._queue)
+            if item_id in self._items and self._items[item_id][2] == version:
+                break
+        priority, record, version = self._items.pop(item_id)
+        del self._by_message[record.message_key]
+        with self.connection:
+            self.connection.execute("delete from review_records where item_id = ?", (item_id,))
+        return priority, item_id, record
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def remove_message(self, message_key):
+        """
+        Removes the queued report of the message with this (guild id, channel id, message id) and
+        returns it as (priority, id, record), or None if it is not queued. Its heap entry is skipped later.
+        """
+        item_id = self._by_message.pop(message_key, None)
+        if item_id is None:
+            return None
+        priority, record, version = self._items.pop(item_id)
+        with self.connection:
+            self.connection.execute("delete from review_records where item_id = ?", (item_id,))
+        return priority, item_id, record
+
+    def is_queued(self, item_id):
+        """
+        Whether the item with this id is still waiting in the queue.
+        """
+        return item_id in self._items
+
+    def has_message(self, message_key):
+        """
+        Whether a report of the message with this (guild id, channel id, message id) is queued.
+        """
+        return message_key in self._by_message
+
+    def pending(self):
+        """
+        Every queued (priority, id, record), in no particular order.
+        """
+        return [(priority, item_id, record) for item_id, (priority, record, version) in self._items.items()]
+
+    def reprioritize(self, item_id, priority: float, record: ReportRecord = None):
+        """
+        Moves a queued report to a new priority (and optionally an updated record) in O(log n).
+        Returns False if the report is no longer queued, e.g. because a reviewer claimed it.
+        """
+        if item_id not in self._items:
+            return False
+        record = record or self._items[item_id][1]
+        self._save(priority, item_id, record)
+        self._push(priority, item_id, record)
+        # Rebuild once outdated entries outnumber live ones, so the heap stays O(queue size)
+        if len(self._queue) > 2 * len(self._items) + 16:
+            self._queue = [(self._key(priority, record), item_id, version) for item_id, (priority, record, version) in self._items.items()]
+            heapq.heapify(self._queue)
+        return True
+
+    def max_age(self):
+        """
+        Seconds the longest-waiting queued report has been waiting (0 if the queue is empty).
+        """
+        if not self._items:
+            return 0.0
+        oldest = min(record.created_at for priority, record, version in self._items.values())
+        return max(0.0, time.time() - oldest.timestamp())
+
+    def claim(self):
+        """
+        Removes and returns the highest-priority item, or None if the queue is empty. There is no
+        await between the check and the removal, so two reviewers can never claim the same report.
+        """
+        try:
+            return self.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def ids(self, name: str = "report_id"):
+        """
+        Endless iterator of IDs (1, 2, 3, ...) that continues where the last run stopped.
+        A drop-in replacement for itertools.count(1).
+        """
+        while True:
+            with self.connection:
+                self.connection.execute(
+                    "insert into counters (name, value) values (?, 1) on conflict(name) do update set value = value + 1",
+                    (name,)
+                )
+                (value,) = self.connection.execute("select value from counters where name = ?", (name,)).fetchone()
+            yield value
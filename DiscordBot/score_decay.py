@@ -0,0 +1,102 @@
+# score_decay.py
+from datetime import datetime, timedelta, timezone
+from math import exp, log
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Scores decay by exp(-DECAY_RATE * days since the event)
+DECAY_RATE = 0.0990
+
+def as_utc(timestamp: datetime):
+    # The bot logs naive local times (datetime.now()); compare everything in UTC
+    return timestamp.astimezone(timezone.utc)
+
+def days_between(earlier: datetime, later: datetime):
+    return (later - earlier).total_seconds() / (24*60*60)
+
+def decayed(score: float, last_updated: datetime, now: datetime):
+    return score * exp(-DECAY_RATE * days_between(last_updated, now))
+
+def fold_perpetrator_rows(scores: dict, rows: list):
+    """
+    Folds perpetrator log rows into maintained scores {perpetrator_id: (score, last_updated)}:
+    score = score*exp(-DECAY_RATE*days) + severity, with days measured from last_updated.
+    Rows older than last_updated are added at their decayed value instead.
+    """
+    for row in sorted(rows, key=lambda row: as_utc(datetime.fromisoformat(row["reported_at"]))):
+        timestamp = as_utc(datetime.fromisoformat(row["reported_at"]))
+        score, last_updated = scores.get(row["perpetrator_id"], (0.0, timestamp))
+        if timestamp >= last_updated:
+            scores[row["perpetrator_id"]] = (decayed(score, last_updated, timestamp) + row["severity"], timestamp)
+        else:
+            scores[row["perpetrator_id"]] = (score + decayed(row["severity"], timestamp, last_updated), last_updated)
+    return scores
+
+def compaction_cutoff(epsilon: float, now: datetime):
+    """
+    Events older than this contribute less than epsilon each (about 93 days for epsilon=1e-4).
+    """
+    return now - timedelta(days=log(1 / epsilon) / DECAY_RATE)
+
+def fold_victim_rows(rows: list, cutoff: datetime):
+    """
+    Folds victim rows older than cutoff into one summary row per victim_key, reported at cutoff,
+    whose weight carries their decayed total, so the score is unchanged. With cutoff from
+    compaction_cutoff, a summary currently contributes weight * epsilon; those with weight <= 1
+    are left out, changing that victim's score by at most epsilon.
+    """
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(row["victim_key"], {
+            "victim_name": row["victim_name"],
+            "victim_key": row["victim_key"],
+            "reported_at": cutoff.isoformat(),
+            "weight": 0.0
+        })
+        summary["weight"] += (row.get("weight") or 1) * exp(-DECAY_RATE * days_between(as_utc(datetime.fromisoformat(row["reported_at"])), cutoff))
+    return [summary for summary in summaries.values() if summary["weight"] > 1]
+
+def decay_sums(groups: list, weights: list, ages: list, size: int):
+    """
+    Sum of weight * exp(-DECAY_RATE * age in days) for each group index in range(size).
+    One vectorised pass with NumPy when it is installed, a plain loop otherwise.
+    """
+    if np is not None and len(groups):
+        contributions = np.asarray(weights, dtype=float) * np.exp(-DECAY_RATE * np.asarray(ages, dtype=float))
+        return np.bincount(np.asarray(groups, dtype=np.intp), weights=contributions, minlength=size).tolist()
+    sums = [0.0] * size
+    for group, weight, age in zip(groups, weights, ages):
+        sums[group] += weight * exp(-DECAY_RATE * age)
+    return sums
+
+def bulk_perpetrator_scores(perpetrator_ids: list, scores: dict, now: datetime):
+    """
+    Maintained scores {perpetrator_id: (score, last_updated)} decayed to now, for every requested ID (0 if unknown).
+    """
+    present = [perpetrator_id for perpetrator_id in perpetrator_ids if perpetrator_id in scores]
+    sums = decay_sums(
+        list(range(len(present))),
+        [scores[perpetrator_id][0] for perpetrator_id in present],
+        [days_between(scores[perpetrator_id][1], now) for perpetrator_id in present],
+        len(present)
+    )
+    result = dict.fromkeys(perpetrator_ids, 0)
+    result.update(zip(present, sums))
+    return result
+
+def bulk_victim_key_scores(rows: list, keys: list, now: datetime):
+    """
+    Decayed totals {victim_key: score} of victim rows (victim_key, reported_at, optional weight) for each key.
+    """
+    index = {key: i for i, key in enumerate(keys)}
+    rows = [row for row in rows if row.get("victim_key") in index]
+    sums = decay_sums(
+        [index[row["victim_key"]] for row in rows],
+        [row.get("weight") or 1 for row in rows],
+        [days_between(as_utc(datetime.fromisoformat(row["reported_at"])), now) for row in rows],
+        len(keys)
+    )
+    return dict(zip(keys, sums))
@@ -0,0 +1,156 @@
+# sqlite_storage.py
+import sqlite3
+from datetime import datetime, timezone
+from math import exp
+from score_decay import DECAY_RATE, as_utc, bulk_perpetrator_scores, bulk_victim_key_scores, compaction_cutoff, days_between, decayed, fold_perpetrator_rows, fold_victim_rows
+from victim_index import VictimIndex, victim_key
+
+SCHEMA = """
+create table if not exists victims (
+    id integer primary key,
+    victim_name text,
+    victim_key text,
+    reported_at text not null,
+    weight real not null default 1
+);
+create index if not exists victims_victim_key on victims (victim_key);
+create index if not exists victims_reported_at on victims (reported_at);
+
+create table if not exists victims_archive (
+    id integer primary key,
+    victim_name text,
+    victim_key text,
+    reported_at text not null,
+    weight real not null default 1
+);
+
+create table if not exists perpetrators (
+    id integer primary key,
+    perpetrator_id text not null,
+    perpetrator_name text,
+    reported_at text not null,
+    victim_name text,
+    severity integer not null default 1
+);
+create index if not exists perpetrators_perpetrator_id on perpetrators (perpetrator_id, reported_at);
+
+create table if not exists perpetrator_scores (
+    perpetrator_id text primary key,
+    score real not null,
+    last_updated text not null
+);
+"""
+
+
+class SQLiteStorage:
+    """
+    Local SQLite implementation of the supabase_helper storage functions, with the same tables,
+    the same maintained perpetrator scores and the same victim identity keys. Writes are local
+    and fast, so there is no write-behind buffer. Timestamps are stored as UTC ISO strings.
+    """
+    def __init__(self, path: str = "moderation.db"):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # WAL lets score reads run while a log insert is being written
+        self.connection.execute("pragma journal_mode=wal")
+        self.connection.execute("pragma synchronous=normal")
+        self.connection.executescript(SCHEMA)
+        # Databases created before compaction have no weight column
+        if "weight" not in [column["name"] for column in self.connection.execute("pragma table_info(victims)")]:
+            with self.connection:
+                self.connection.execute("alter table victims add column weight real not null default 1")
+
+        self.victim_index = VictimIndex()
+        for row in self.connection.execute("select distinct victim_key from victims"):
+            self.victim_index.add(row["victim_key"])
+
+        print(f"✅ SQLite storage opened at {path}")
+
+    def insert_victim_log(self, victim_name: str, timestamp: datetime, perpetrator_id: str = None, perpetrator_name: str = None):
+        key = victim_key(victim_name)
+        with self.connection:
+            self.connection.execute(
+                "insert into victims (victim_name, victim_key, reported_at) values (?, ?, ?)",
+                (victim_name, key, as_utc(timestamp).isoformat())
+            )
+        self.victim_index.add(key)
+
+    def insert_perpetrator_log(self, perpetrator_id: str, perpetrator_name: str, timestamp: datetime, victim_name: str = None, severity: int = 1):
+        row = {
+            "perpetrator_id": perpetrator_id,
+            "perpetrator_name": perpetrator_name,
+            "reported_at": as_utc(timestamp).isoformat(),
+            "victim_name": victim_name,
+            "severity": severity
+        }
+        # The log row and its score update commit together
+        with self.connection:
+            self.connection.execute(
+                "insert into perpetrators (perpetrator_id, perpetrator_name, reported_at, victim_name, severity) "
+                "values (:perpetrator_id, :perpetrator_name, :reported_at, :victim_name, :severity)",
+                row
+            )
+            scores = fold_perpetrator_rows(self._scores([perpetrator_id]), [row])
+            self.connection.executemany(
+                "insert or replace into perpetrator_scores (perpetrator_id, score, last_updated) values (?, ?, ?)",
+                [(perpetrator_id, score, last_updated.isoformat()) for perpetrator_id, (score, last_updated) in scores.items()]
+            )
+
+    def get_perpetrator_score(self, perpetrator_id: str):
+        scores = self._scores([perpetrator_id])
+        if perpetrator_id not in scores:
+            return 0
+        score, last_updated = scores[perpetrator_id]
+        return decayed(score, last_updated, datetime.now(timezone.utc))
+
+    def victim_score(self, victim_name: str):
+        keys = sorted(self.victim_index.variants(self.victim_index.resolve(victim_key(victim_name))))
+        now = datetime.now(timezone.utc)
+        rows = self.connection.execute(
+            f"select reported_at, weight from victims where victim_key in ({', '.join('?' * len(keys))})", keys
+        )
+        return sum(row["weight"] * exp(-DECAY_RATE * days_between(datetime.fromisoformat(row["reported_at"]), now)) for row in rows)
+
+    def get_perpetrator_scores(self, perpetrator_ids: list):
+        perpetrator_ids = list(dict.fromkeys(perpetrator_ids))
+        return bulk_perpetrator_scores(perpetrator_ids, self._scores(perpetrator_ids), datetime.now(timezone.utc))
+
+    def victim_scores(self, victim_names: list):
+        canonical = {name: self.victim_index.resolve(victim_key(name)) for name in victim_names}
+        variants = {key: self.victim_index.variants(key) for key in set(canonical.values())}
+        keys = sorted(set().union(*variants.values())) if variants else []
+        rows = [dict(row) for row in self.connection.execute(
+            f"select victim_key, reported_at, weight from victims where victim_key in ({', '.join('?' * len(keys))})", keys
+        )]
+        key_scores = bulk_victim_key_scores(rows, keys, datetime.now(timezone.utc))
+        return {name: sum(key_scores[key] for key in variants[canonical[name]]) for name in canonical}
+
+    def compact_victims(self, epsilon: float = 1e-4):
+        """
+        Moves victim rows older than the epsilon horizon to victims_archive, replacing them with one
+        summary row per victim (see fold_victim_rows). Each victim's score changes by at most epsilon.
+        """
+        cutoff = compaction_cutoff(epsilon, datetime.now(timezone.utc))
+        with self.connection:
+            rows = [dict(row) for row in self.connection.execute(
+                "select id, victim_name, victim_key, reported_at, weight from victims where reported_at < ?", (cutoff.isoformat(),)
+            )]
+            summaries = fold_victim_rows(rows, cutoff)
+            self.connection.execute(
+                "insert into victims_archive (id, victim_name, victim_key, reported_at, weight) "
+                "select id, victim_name, victim_key, reported_at, weight from victims where reported_at < ?", (cutoff.isoformat(),)
+            )
+            self.connection.execute("delete from victims where reported_at < ?", (cutoff.isoformat(),))
+            self.connection.executemany(
+                "insert into victims (victim_name, victim_key, reported_at, weight) values (:victim_name, :victim_key, :reported_at, :weight)",
+                summaries
+            )
+        print(f"✅ Compacted {len(rows)} victim rows into {len(summaries)} summary rows")
+
+    def _scores(self, perpetrator_ids: list):
+        rows = self.connection.execute(
+            f"select perpetrator_id, score, last_updated from perpetrator_scores where perpetrator_id in ({', '.join('?' * len(perpetrator_ids))})",
+            perpetrator_ids
+        )
+        return {row["perpetrator_id"]: (row["score"], datetime.fromisoformat(row["last_updated"])) for row in rows}
@@ -0,0 +1,118 @@
+-- supabase_functions.sql
+-- Run once in the Supabase SQL editor (safe to re-run). Creates or upgrades every table and function
+-- supabase_helper.py uses, so one run sets up a working schema.
+
+-- Victim and perpetrator logs. Columns added since the tables were first created are added to
+-- existing tables below.
+create table if not exists victims (
+    id bigint generated by default as identity primary key,
+    victim_name text,
+    reported_at timestamptz not null
+);
+alter table victims add column if not exists victim_key text;
+alter table victims add column if not exists weight real not null default 1;
+alter table victims add column if not exists event_id text unique;
+create index if not exists victims_victim_key on victims (victim_key);
+
+create table if not exists perpetrators (
+    id bigint generated by default as identity primary key,
+    perpetrator_id text not null,
+    perpetrator_name text,
+    reported_at timestamptz not null,
+    victim_name text,
+    severity integer not null default 1
+);
+alter table perpetrators add column if not exists event_id text unique;
+create index if not exists perpetrators_perpetrator_id on perpetrators (perpetrator_id, reported_at);
+
+-- Decayed score per perpetrator, maintained by apply_perpetrator_events
+create table if not exists perpetrator_scores (
+    perpetrator_id text primary key,
+    score double precision not null,
+    last_updated timestamptz not null
+);
+
+-- Event IDs of perpetrator rows already folded into perpetrator_scores
+create table if not exists perpetrator_score_events (
+    event_id text primary key,
+    applied_at timestamptz not null default now()
+);
+
+-- Folds perpetrator log events into perpetrator_scores in one transaction, exactly once per event:
+-- score = score*exp(-decay_rate*days) + severity, with days measured from last_updated, and events
+-- older than last_updated added at their decayed value (the same fold as score_decay.fold_perpetrator_rows).
+-- An event whose ID is already in perpetrator_score_events is skipped, so a retried flush never
+-- counts the same event twice.
+create or replace function apply_perpetrator_events(events jsonb, decay_rate double precision)
+returns void
+language plpgsql
+as $$
+declare
+    event record;
+    current_score double precision;
+    current_updated timestamptz;
+begin
+    for event in
+        select e.event_id, e.perpetrator_id, e.reported_at, e.severity
+        from jsonb_to_recordset(events) as e(event_id text, perpetrator_id text, reported_at timestamptz, severity double precision)
+        order by e.reported_at
+    loop
+        insert into perpetrator_score_events (event_id) values (event.event_id) on conflict do nothing;
+        if not found then
+            continue;
+        end if;
+
+        select score, last_updated into current_score, current_updated
+        from perpetrator_scores where perpetrator_id = event.perpetrator_id
+        for update;
+
+        if not found then
+            insert into perpetrator_scores (perpetrator_id, score, last_updated)
+            values (event.perpetrator_id, event.severity, event.reported_at);
+        elsif event.reported_at >= current_updated then
+            update perpetrator_scores
+            set score = current_score * exp(-decay_rate * extract(epoch from event.reported_at - current_updated) / 86400) + event.severity,
+                last_updated = event.reported_at
+            where perpetrator_id = event.perpetrator_id;
+        else
+            update perpetrator_scores
+            set score = current_score + event.severity * exp(-decay_rate * extract(epoch from current_updated - event.reported_at) / 86400)
+            where perpetrator_id = event.perpetrator_id;
+        end if;
+    end loop;
+end;
+$$;
+
+-- Compacted victim rows, with the same columns as victims
+create table if not exists victims_archive (like victims including all);
+
+-- Moves victim rows reported before cutoff to victims_archive and replaces them with one summary
+-- row per victim_key, reported at cutoff, whose weight carries their decayed total (the same fold
+-- as score_decay.fold_victim_rows; summaries with weight <= 1 are left out). Everything happens in
+-- one transaction, so an interrupted run leaves the table untouched rather than half compacted.
+create or replace function compact_victims(cutoff timestamptz, decay_rate double precision)
+returns jsonb
+language plpgsql
+as $$
+declare
+    compacted bigint;
+    summaries bigint;
+begin
+    create temporary table compacted_victims on commit drop as
+        select * from victims where reported_at < cutoff;
+    get diagnostics compacted = row_count;
+
+    insert into victims_archive select * from compacted_victims on conflict do nothing;
+    delete from victims where id in (select id from compacted_victims);
+
+    insert into victims (victim_name, victim_key, reported_at, weight)
+    select (array_agg(victim_name order by id))[1], victim_key, cutoff,
+           sum(coalesce(weight, 1) * exp(-decay_rate * extract(epoch from cutoff - reported_at) / 86400))
+    from compacted_victims
+    group by victim_key
+    having sum(coalesce(weight, 1) * exp(-decay_rate * extract(epoch from cutoff - reported_at) / 86400)) > 1;
+    get diagnostics summaries = row_count;
+
+    return jsonb_build_object('rows', compacted, 'summaries', summaries);
+end;
+$$;
@@ -1,8 +1,15 @@
 import os
+import sys
+import asyncio
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import json
 from math import exp
+from ttl_cache import TTLCache
+from score_decay import DECAY_RATE, as_utc, bulk_perpetrator_scores, bulk_victim_key_scores, compaction_cutoff, days_between, decayed, fold_perpetrator_rows
+from victim_index import VictimIndex, victim_key
+from sqlite_storage import SQLiteStorage
+from outbox import Outbox
 
 # Load environment variables from .env.local or .env
 load_dotenv(dotenv_path='.env.local')
@@ -19,6 +26,10 @@ except ImportError:
     print("ImportError")
     create_client = None
     Client = None
+try:
+    from supabase import acreate_client
+except ImportError:
+    acreate_client = None
 
 client = None
 if create_client and SUPABASE_URL and SUPABASE_KEY:
@@ -30,73 +41,460 @@ if create_client and SUPABASE_URL and SUPABASE_KEY:
 elif not (SUPABASE_URL and SUPABASE_KEY):
     print("Missing SUPABASE URL and/or key")
 
-# Insert a victim log row
-def insert_victim_log(victim_name: str, timestamp: datetime, perpetrator_id: str = None, perpetrator_name: str = None):
-    if client is None:
-        print("insert_victim_log error: no client")
+# Storage backend: STORAGE_BACKEND=sqlite keeps everything in a local SQLite file (SQLITE_PATH).
+# With the default STORAGE_FALLBACK=sqlite, the same happens when Supabase is unavailable.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+local_storage = None
+if STORAGE_BACKEND == "sqlite" or (client is None and os.getenv("STORAGE_FALLBACK", "sqlite") == "sqlite"):
+    if STORAGE_BACKEND != "sqlite":
+        print("Supabase unavailable, falling back to local SQLite storage")
+    local_storage = SQLiteStorage(os.getenv("SQLITE_PATH", "moderation.db"))
+
+# Recently read scores, kept as (score, as_of). All scores decay at DECAY_RATE, so a cached score is
+# brought forward to the current time locally instead of being read again. Inserts fold the new event
+# into a cached entry (write-through), so scoring the author of a message that was just logged needs no read.
+score_cache = TTLCache(max_entries=int(os.getenv("SCORE_CACHE_SIZE", 10000)), ttl=float(os.getenv("SCORE_CACHE_TTL", 300)))
+
+def _cached_score(key: tuple, fetch):
+    now = datetime.now(timezone.utc)
+    cached = score_cache.get(key)
+    if cached is not None:
+        score, as_of = cached
+        return decayed(score, as_of, now)
+    score = fetch(now)
+    score_cache.put(key, (score, now))
+    return score
+
+def _add_to_cached_score(key: tuple, amount: float, timestamp: datetime):
+    # Nothing to update if the score is not cached; the next read includes the event
+    cached = score_cache.get(key)
+    if cached is None:
         return
-    try:
-        data_to_insert = {
-            "victim_name": victim_name,
-            "reported_at": timestamp.isoformat(),
+    now = datetime.now(timezone.utc)
+    score, as_of = cached
+    score_cache.put(key, (decayed(score, as_of, now) + decayed(amount, as_utc(timestamp), now), now))
+
+def score_cache_stats():
+    """
+    Size, hits, misses, evictions and hit rate of the score cache.
+    """
+    return score_cache.stats()
+
+def _score_rows(scores: dict):
+    return [
+        {"perpetrator_id": perpetrator_id, "score": score, "last_updated": last_updated.isoformat()}
+        for perpetrator_id, (score, last_updated) in scores.items()
+    ]
+
+def _score_events(rows: list):
+    # Arguments for the apply_perpetrator_events function (see supabase_functions.sql)
+    events = [
+        {
+            "event_id": row["event_id"],
+            "perpetrator_id": row["perpetrator_id"],
+            "reported_at": as_utc(datetime.fromisoformat(row["reported_at"])).isoformat(),
+            "severity": row["severity"]
         }
-        response = client.table("victims").insert(data_to_insert).execute()
-    except Exception as e:
-        print(f"insert_victim_log error: insert failed") 
+        for row in rows
+    ]
+    return {"events": events, "decay_rate": DECAY_RATE}
 
-# Insert a perpetrator log row (separate tracking for consequences)
-def insert_perpetrator_log(perpetrator_id: str, perpetrator_name: str, timestamp: datetime, victim_name: str = None, severity: int = 1):
+def _parse_scores(data: list):
+    return {row["perpetrator_id"]: (row["score"], as_utc(datetime.fromisoformat(row["last_updated"]))) for row in data}
+
+# Write-behind outbox: every log row is first recorded in a local durable outbox (OUTBOX_PATH) under
+# an event ID. Once start_writer() has run in the bot's event loop, a background task writes the
+# outbox in bulk (every SUPABASE_FLUSH_INTERVAL seconds, or as soon as SUPABASE_FLUSH_ROWS rows are
+# waiting), so moderation actions never wait on Supabase. Rows are inserted with an upsert on
+# event_id, so a retried write is never logged twice. Failed writes are retried with backoff and
+# survive restarts; perpetrator rows then stay in the outbox until they have been folded into
+# perpetrator_scores. The fold runs in the database (apply_perpetrator_events), which records each
+# event ID in the same transaction, so a retried fold never counts an event twice.
+# Scores include everything still in the outbox.
+# Without a writer (e.g. in scripts) each row is written straight away and left in the outbox on failure.
+FLUSH_ROWS = int(os.getenv("SUPABASE_FLUSH_ROWS", 50))
+FLUSH_INTERVAL = float(os.getenv("SUPABASE_FLUSH_INTERVAL", 1.0))
+async_client = None
+outbox = Outbox(os.getenv("OUTBOX_PATH", "outbox.db")) if local_storage is None else None
+_writer_task = None
+_flush_lock = None
+_flush_tasks = set()
+
+async def start_writer():
+    """
+    Creates the async client (one pooled HTTP connection for all inserts) and starts the flush loop.
+    """
+    global async_client, _writer_task, _flush_lock
+    if _writer_task is not None or local_storage is not None:
+        return
+    if acreate_client and SUPABASE_URL and SUPABASE_KEY:
+        try:
+            async_client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        except Exception as e:
+            print(f"Could not create async client: {e}")
+    if async_client is None:
+        print("start_writer error: no async client, inserts stay synchronous")
+        return
+    backlog = outbox.backlog()
+    if backlog["pending"]:
+        print(f"📤 {backlog['pending']} database writes waiting in the outbox from a previous run")
+    _flush_lock = asyncio.Lock()
+    _writer_task = asyncio.create_task(_flush_loop())
+
+async def stop_writer():
+    """
+    Stops the flush loop and makes one last attempt at whatever is still waiting.
+    Anything that fails stays in the outbox for the next run.
+    """
+    global _writer_task
+    if _writer_task is None:
+        return
+    _writer_task.cancel()
+    _writer_task = None
+    await flush_pending()
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush_pending()
+
+async def flush_pending():
+    """
+    Writes every due outbox event, one bulk request per table. Failed events are retried later with backoff.
+    """
+    async with _flush_lock:
+        for table in ("victims", "perpetrators"):
+            events = outbox.due(table)
+            if not events:
+                continue
+            event_ids = [event_id for event_id, row in events]
+            try:
+                await async_client.table(table).upsert([row for event_id, row in events], on_conflict="event_id", ignore_duplicates=True).execute()
+            except Exception as e:
+                print(f"flush_pending error: insert of {len(events)} {table} rows failed, will retry")
+                outbox.retry_later(event_ids)
+                continue
+            if table == "perpetrators":
+                outbox.advance(event_ids, "perpetrator_scores")
+            else:
+                outbox.done(event_ids)
+
+        events = outbox.due("perpetrator_scores")
+        if events:
+            event_ids = [event_id for event_id, row in events]
+            rows = [row for event_id, row in events]
+            try:
+                await async_client.rpc("apply_perpetrator_events", _score_events(rows)).execute()
+            except Exception as e:
+                print(f"flush_pending error: update of {len(rows)} perpetrator scores failed, will retry")
+                outbox.retry_later(event_ids)
+                return
+            outbox.done(event_ids)
+
+def outbox_backlog():
+    """
+    Database writes still waiting in the outbox: totals per table, how many have failed, and the oldest's age.
+    """
+    if outbox is None:
+        return {"pending": 0, "by_kind": {}, "failing": 0, "oldest_seconds": 0.0}
+    return outbox.backlog()
+
+def _unwritten(table: str):
+    # Rows recorded in the outbox but not yet reflected in the table (or, for scores, in perpetrator_scores)
+    if table == "perpetrators":
+        return outbox.rows("perpetrators") + outbox.rows("perpetrator_scores")
+    return outbox.rows(table)
+
+def _insert(table: str, row: dict, caller: str):
+    event_id, row = outbox.add(table, row)
+    if _writer_task is not None:
+        if outbox_backlog()["pending"] >= FLUSH_ROWS:
+            task = asyncio.get_running_loop().create_task(flush_pending())
+            _flush_tasks.add(task)
+            task.add_done_callback(_flush_tasks.discard)
+        return
     if client is None:
-        print("insert_perpetrator_log error: no client")
+        print(f"{caller} error: no client, kept in outbox")
         return
     try:
-        data_to_insert = {
-            "perpetrator_id": perpetrator_id,
-            "perpetrator_name": perpetrator_name,
-            "reported_at": timestamp.isoformat(),
-            "victim_name": victim_name,
-            "severity": severity
-        }
-        response = client.table("perpetrators").insert(data_to_insert).execute()
+        client.table(table).upsert([row], on_conflict="event_id", ignore_duplicates=True).execute()
+    except Exception as e:
+        print(f"{caller} error: insert failed, kept in outbox")
+        outbox.retry_later([event_id])
+        return
+    if table != "perpetrators":
+        outbox.done([event_id])
+        return
+    outbox.advance([event_id], "perpetrator_scores")
+    if _update_scores_sync([row]):
+        outbox.done([event_id])
+    else:
+        outbox.retry_later([event_id])
+
+def _update_scores_sync(rows: list):
+    try:
+        client.rpc("apply_perpetrator_events", _score_events(rows)).execute()
+        return True
     except Exception as e:
-        print(f"insert_perpetrator_log error: insert failed")
+        print(f"update_scores error: {e}")
+        return False
 
-# Get perpetrator harassment count from database (alternative to in-memory count.py)
+# Insert a victim log row
+def insert_victim_log(victim_name: str, timestamp: datetime, perpetrator_id: str = None, perpetrator_name: str = None):
+    if local_storage is not None:
+        return local_storage.insert_victim_log(victim_name, timestamp, perpetrator_id, perpetrator_name)
+    key = victim_key(victim_name)
+    data_to_insert = {
+        "victim_name": victim_name,
+        "victim_key": key,
+        "reported_at": timestamp.isoformat(),
+    }
+    _load_victim_index()
+    if key in victim_index.keys:
+        _add_to_cached_score(("victim", victim_index.resolve(key)), 1, timestamp)
+    else:
+        # A new spelling can change which names are summed together, so those scores are read again
+        victim_index.add(key)
+        for variant in victim_index.variants(key):
+            score_cache.invalidate(("victim", variant))
+    _insert("victims", data_to_insert, "insert_victim_log")
+
+# Insert a perpetrator log row (separate tracking for consequences)
+def insert_perpetrator_log(perpetrator_id: str, perpetrator_name: str, timestamp: datetime, victim_name: str = None, severity: int = 1):
+    if local_storage is not None:
+        return local_storage.insert_perpetrator_log(perpetrator_id, perpetrator_name, timestamp, victim_name, severity)
+    data_to_insert = {
+        "perpetrator_id": perpetrator_id,
+        "perpetrator_name": perpetrator_name,
+        "reported_at": timestamp.isoformat(),
+        "victim_name": victim_name,
+        "severity": severity
+    }
+    _add_to_cached_score(("perpetrator", perpetrator_id), severity, timestamp)
+    _insert("perpetrators", data_to_insert, "insert_perpetrator_log")
+
+# Get perpetrator harassment score from the maintained perpetrator_scores row (alternative to in-memory count.py)
 def get_perpetrator_score(perpetrator_id: str):
+    if local_storage is not None:
+        return local_storage.get_perpetrator_score(perpetrator_id)
     if client is None:
         print("get_perpetrator_score error: no client")
         return 0
     try:
-        response = client.table("perpetrators").select("reported_at", "severity").eq("perpetrator_id", perpetrator_id).execute()
-        score = 0
-        now = datetime.now(timezone.utc)
-        for entry in json.loads(response.json())["data"]:
-            time = entry["reported_at"]
-            severity = entry["severity"]
-            try:
-                difference = now - datetime.fromisoformat(time)
-                score += severity * exp(-0.0990 * (difference.days * (24*60*60) + difference.seconds) / (24*60*60))
-            except Exception as e:
-                print(e)
-        return score
+        return _cached_score(("perpetrator", perpetrator_id), lambda now: _fetch_perpetrator_score(perpetrator_id, now))
     except Exception as e:
         print(f"get_perpetrator_score error: query failed")
         print(e)
         return 0
 
+def _fetch_perpetrator_score(perpetrator_id: str, now: datetime):
+    response = client.table("perpetrator_scores").select("perpetrator_id", "score", "last_updated").eq("perpetrator_id", perpetrator_id).execute()
+    scores = _parse_scores(response.data)
+    # Rows not yet folded into the table still count
+    unfolded = [row for row in _unwritten("perpetrators") if row["perpetrator_id"] == perpetrator_id]
+    scores = fold_perpetrator_rows(scores, unfolded)
+    if perpetrator_id not in scores:
+        return 0
+    score, last_updated = scores[perpetrator_id]
+    return decayed(score, last_updated, now)
+
+def backfill_perpetrator_scores(page_size: int = 1000):
+    """
+    Rebuilds perpetrator_scores from the full perpetrators log and marks every logged event as
+    applied. Run once after creating the table, while the bot is stopped.
+    """
+    if client is None:
+        print("backfill_perpetrator_scores error: no client")
+        return
+    scores = {}
+    start = 0
+    while True:
+        response = client.table("perpetrators").select("event_id", "perpetrator_id", "reported_at", "severity").order("reported_at").range(start, start + page_size - 1).execute()
+        fold_perpetrator_rows(scores, response.data)
+        # Events still waiting in an outbox must not be folded a second time
+        applied = [{"event_id": row["event_id"]} for row in response.data if row.get("event_id")]
+        if applied:
+            client.table("perpetrator_score_events").upsert(applied, on_conflict="event_id", ignore_duplicates=True).execute()
+        if len(response.data) < page_size:
+            break
+        start += page_size
+    for i in range(0, len(scores), page_size):
+        client.table("perpetrator_scores").upsert(_score_rows(dict(list(scores.items())[i:i + page_size]))).execute()
+    print(f"✅ Backfilled scores for {len(scores)} perpetrators")
+
+# Victim identity index: every victim_key logged so far, loaded from the table on first use
+victim_index = VictimIndex()
+_victim_index_loaded = False
+
+def _load_victim_index(keys: list = None):
+    # keys, if given, were already fetched with _fetch_victim_keys (e.g. in a worker thread)
+    global _victim_index_loaded
+    if _victim_index_loaded or client is None:
+        return
+    try:
+        for key in keys if keys is not None else _fetch_victim_keys():
+            victim_index.add(key)
+        _victim_index_loaded = True
+    except Exception as e:
+        print(f"load_victim_index error: {e}")
+
+def _fetch_victim_keys(page_size: int = 1000):
+    keys = []
+    start = 0
+    while True:
+        response = client.table("victims").select("victim_key").range(start, start + page_size - 1).execute()
+        keys += [row["victim_key"] for row in response.data]
+        if len(response.data) < page_size:
+            return keys
+        start += page_size
+
+def backfill_victim_keys(page_size: int = 1000):
+    """
+    Fills in victim_key for victims rows logged before the column existed.
+    """
+    if client is None:
+        print("backfill_victim_keys error: no client")
+        return
+    filled = 0
+    while True:
+        response = client.table("victims").select("id", "victim_name", "reported_at").is_("victim_key", "null").limit(page_size).execute()
+        if not response.data:
+            break
+        client.table("victims").upsert([{**row, "victim_key": victim_key(row["victim_name"])} for row in response.data]).execute()
+        filled += len(response.data)
+    print(f"✅ Backfilled victim keys for {filled} rows")
+
 def victim_score(victim_name: str):
+    if local_storage is not None:
+        return local_storage.victim_score(victim_name)
     if client is None:
         print("victim_score error: no client")
         return
     try:
-        response = client.table("victims").select("reported_at").eq("victim_name", victim_name).execute() 
-        score = 0
-        now = datetime.now(timezone.utc)
-        for entry in json.loads(response.json())["data"]:
-            time = entry["reported_at"]
-            difference = now - datetime.fromisoformat(time)
-            score += exp(-0.0990 * (difference.days * (24*60*60) + difference.seconds) / (24*60*60))
-        return score
+        _load_victim_index()
+        key = victim_index.resolve(victim_key(victim_name))
+        return _cached_score(("victim", key), lambda now: _fetch_victim_score(victim_index.variants(key), now))
     except Exception as e:
         print(f"victim_score error: query failed")
-        return 0
\ No newline at end of file
+        return 0
+
+def _fetch_victim_score(keys: set, now: datetime):
+    # One indexed fetch covering every spelling of the victim's name
+    response = client.table("victims").select("reported_at", "weight").in_("victim_key", sorted(keys)).execute() 
+    score = 0
+    for entry in json.loads(response.json())["data"] + [row for row in _unwritten("victims") if row.get("victim_key") in keys]:
+        time = entry["reported_at"]
+        # Summary rows left by compact_victims carry the weight of the rows they replaced
+        score += (entry.get("weight") or 1) * exp(-DECAY_RATE * days_between(as_utc(datetime.fromisoformat(time)), now))
+    return score
+
+# IDs or keys per request in the bulk score functions, to keep request URLs short
+BULK_CHUNK = 200
+
+def get_perpetrator_scores(perpetrator_ids: list):
+    """
+    Scores for many perpetrators at once, {perpetrator_id: score}, from one query per BULK_CHUNK IDs.
+    """
+    perpetrator_ids = list(dict.fromkeys(perpetrator_ids))
+    if local_storage is not None:
+        return local_storage.get_perpetrator_scores(perpetrator_ids)
+    if client is None:
+        print("get_perpetrator_scores error: no client")
+        return dict.fromkeys(perpetrator_ids, 0)
+    try:
+        scores = {}
+        for i in range(0, len(perpetrator_ids), BULK_CHUNK):
+            response = client.table("perpetrator_scores").select("perpetrator_id", "score", "last_updated").in_("perpetrator_id", perpetrator_ids[i:i + BULK_CHUNK]).execute()
+            scores.update(_parse_scores(response.data))
+        wanted = set(perpetrator_ids)
+        scores = fold_perpetrator_rows(scores, [row for row in _unwritten("perpetrators") if row["perpetrator_id"] in wanted])
+        return bulk_perpetrator_scores(perpetrator_ids, scores, datetime.now(timezone.utc))
+    except Exception as e:
+        print(f"get_perpetrator_scores error: query failed")
+        print(e)
+        return dict.fromkeys(perpetrator_ids, 0)
+
+def victim_scores(victim_names: list):
+    """
+    Scores for many victims at once, {victim_name: score}, summed across name variants like victim_score.
+    """
+    victim_names = list(dict.fromkeys(victim_names))
+    if local_storage is not None:
+        return local_storage.victim_scores(victim_names)
+    if client is None:
+        print("victim_scores error: no client")
+        return dict.fromkeys(victim_names, 0)
+    try:
+        _load_victim_index()
+        canonical, variants, keys = _victim_variants(victim_names)
+        return _sum_victim_scores(victim_names, canonical, variants, keys, _fetch_victim_rows(keys))
+    except Exception as e:
+        print(f"victim_scores error: query failed")
+        return dict.fromkeys(victim_names, 0)
+
+async def victim_scores_async(victim_names: list):
+    """
+    victim_scores for the bot's event loop. The Supabase queries run in a worker thread; the victim
+    index and the outbox are not thread-safe, so they are only used on the loop.
+    """
+    victim_names = list(dict.fromkeys(victim_names))
+    if local_storage is not None:
+        return local_storage.victim_scores(victim_names)
+    if client is None:
+        print("victim_scores error: no client")
+        return dict.fromkeys(victim_names, 0)
+    try:
+        if not _victim_index_loaded:
+            _load_victim_index(await asyncio.to_thread(_fetch_victim_keys))
+        canonical, variants, keys = _victim_variants(victim_names)
+        rows = await asyncio.to_thread(_fetch_victim_rows, keys)
+        return _sum_victim_scores(victim_names, canonical, variants, keys, rows)
+    except Exception as e:
+        print(f"victim_scores error: query failed")
+        return dict.fromkeys(victim_names, 0)
+
+def _victim_variants(victim_names: list):
+    # Canonical key per name, the keys that count toward each canonical key, and all of those keys
+    canonical = {name: victim_index.resolve(victim_key(name)) for name in victim_names}
+    variants = {key: victim_index.variants(key) for key in set(canonical.values())}
+    keys = sorted(set().union(*variants.values())) if variants else []
+    return canonical, variants, keys
+
+def _fetch_victim_rows(keys: list):
+    rows = []
+    for i in range(0, len(keys), BULK_CHUNK):
+        response = client.table("victims").select("victim_key", "reported_at", "weight").in_("victim_key", keys[i:i + BULK_CHUNK]).execute()
+        rows += response.data
+    return rows
+
+def _sum_victim_scores(victim_names: list, canonical: dict, variants: dict, keys: list, rows: list):
+    key_scores = bulk_victim_key_scores(rows + _unwritten("victims"), keys, datetime.now(timezone.utc))
+    return {name: sum(key_scores[key] for key in variants[canonical[name]]) for name in victim_names}
+
+def compact_victims(epsilon: float = 1e-4):
+    """
+    Moves victim rows older than the epsilon horizon (about 93 days for 1e-4) to victims_archive and
+    replaces them with one summary row per victim, so victim_score reads scale with recent activity.
+    Each victim's score changes by at most epsilon. Run while the bot is stopped.
+    """
+    if local_storage is not None:
+        return local_storage.compact_victims(epsilon)
+    if client is None:
+        print("compact_victims error: no client")
+        return
+    cutoff = compaction_cutoff(epsilon, datetime.now(timezone.utc))
+    # One database transaction (see supabase_functions.sql), so a failed run never double-counts history
+    result = client.rpc("compact_victims", {"cutoff": cutoff.isoformat(), "decay_rate": DECAY_RATE}).execute().data
+    score_cache.clear()
+    print(f"✅ Compacted {result['rows']} victim rows into {result['summaries']} summary rows")
+
+if __name__ == "__main__":
+    # python supabase_helper.py backfill
+    # python supabase_helper.py compact [epsilon]
+    if sys.argv[1:] == ["backfill"]:
+        backfill_perpetrator_scores()
+        backfill_victim_keys()
+    elif sys.argv[1:2] == ["compact"]:
+        compact_victims(*[float(arg) for arg in sys.argv[2:3]])
+    else:
+        print("Usage: python supabase_helper.py backfill | compact [epsilon]")
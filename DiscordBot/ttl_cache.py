@@ -0,0 +1,99 @@
+# ttl_cache.py
+import copy
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache. Entries expire after ttl seconds and the least recently
+    used entry is evicted once max_entries is reached. Keeps hit/miss counters.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class VerdictCache(TTLCache):
+    """
+    Caches detector analysis dicts by normalised message content and author relation,
+    so reposts of the same text reuse the first verdict instead of calling the LLM again.
+    """
+    ZERO_WIDTH = re.compile('[\u200b-\u200f\u2060\ufeff]')
+
+    def key_for(self, message_content: str, author_name: str = "Unknown"):
+        content = self.normalize(message_content)
+        return hashlib.sha256(f"{self.author_relation(content, author_name)}|{content}".encode()).hexdigest()
+
+    def normalize(self, message_content: str):
+        """
+        Fold case, width and spacing so trivially edited copies share one entry.
+        """
+        content = unicodedata.normalize("NFKC", message_content)
+        content = self.ZERO_WIDTH.sub("", content).casefold()
+        return " ".join(content.split())
+
+    def author_relation(self, normalized_content: str, author_name: str):
+        """
+        Whether the author's own name appears in the message. The prompt scores
+        self-disclosure differently, so the same text by different authors only
+        shares a verdict when neither (or both) mention themselves.
+        """
+        name_parts = [part for part in re.split(r'\W+', (author_name or "").casefold()) if len(part) >= 3]
+        if any(re.search(rf'\b{re.escape(part)}\b', normalized_content) for part in name_parts):
+            return "author_named"
+        return "other"
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        return copy.deepcopy(value) if value is not default else default
+
+    def put(self, key, value):
+        super().put(key, copy.deepcopy(value))
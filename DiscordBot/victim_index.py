@@ -0,0 +1,67 @@
+# victim_index.py
+import re
+import unicodedata
+from collections import defaultdict
+
+
+def victim_key(victim_name: str):
+    """
+    Normalised identity key for a victim name: accents, case, punctuation and spacing are folded,
+    so "Anna  Morchild", "anna morchild" and "Änna Morchild" share one key.
+    """
+    name = unicodedata.normalize("NFKD", victim_name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    name = re.sub(r"['’]", "", name)
+    name = re.sub(r"[^\w\s]|_", " ", name)
+    return " ".join(name.split())
+
+
+class VictimIndex:
+    """
+    In-memory index of the victim keys that have been logged. Resolves an abbreviated surname
+    ("anna m") to the one full name it fits ("anna morchild"), so scores can be summed across
+    every spelling of the same person. Ambiguous abbreviations stay separate.
+    """
+    def __init__(self):
+        self.keys = set()
+        self._full_names = defaultdict(set) # (first name, surname initial) -> full keys
+        self._abbreviations = defaultdict(set) # (first name, surname initial) -> abbreviated keys
+
+    @staticmethod
+    def _initial_bucket(key: str):
+        tokens = key.split()
+        if len(tokens) < 2:
+            return None, False
+        return (tokens[0], tokens[-1][0]), len(tokens[-1]) == 1
+
+    def add(self, key: str):
+        if not key or key in self.keys:
+            return
+        self.keys.add(key)
+        bucket, abbreviated = self._initial_bucket(key)
+        if bucket is None:
+            return
+        if abbreviated:
+            self._abbreviations[bucket].add(key)
+        else:
+            self._full_names[bucket].add(key)
+
+    def resolve(self, key: str):
+        """
+        The canonical key for key: the matching full name for an unambiguous abbreviation, otherwise key itself.
+        """
+        bucket, abbreviated = self._initial_bucket(key)
+        if abbreviated and len(self._full_names.get(bucket, ())) == 1:
+            return next(iter(self._full_names[bucket]))
+        return key
+
+    def variants(self, key: str):
+        """
+        Every logged key that resolves to the same person as key (including key itself).
+        """
+        canonical = self.resolve(key)
+        variants = {key, canonical}
+        bucket, abbreviated = self._initial_bucket(canonical)
+        if bucket is not None and not abbreviated and len(self._full_names.get(bucket, ())) == 1:
+            variants |= self._abbreviations.get(bucket, set())
+        return variants